@@ -0,0 +1,67 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import models, schemas, crud
+
+
+# --- CRUD ASYNC ---
+# Las consultas simples están escritas con select() nativo. Las que ya
+# existen en crud.py (filtros, agregados, ledger) se reutilizan con
+# run_sync(): corren sobre la conexión async sin bloquear el event loop.
+# Todo lo que se devuelve tiene que venir cargado, porque en async no
+# hay lazy loading al serializar.
+
+# --- USUARIOS ---
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
+
+# --- CUENTAS Y CATEGORÍAS ---
+async def get_accounts(db: AsyncSession, user_id: int):
+    result = await db.execute(select(models.Account).where(models.Account.user_id == user_id))
+    return result.scalars().all()
+
+async def get_categories(db: AsyncSession, user_id: int):
+    # Sale de la caché de crud; solo consulta si falta algo
+    return await db.run_sync(crud.get_user_categories, user_id)
+
+# --- TRANSACCIONES ---
+async def create_transaction(db: AsyncSession, transaction: schemas.TransactionCreate, user_id: int):
+    def _create(session):
+        db_transaction = crud.create_transaction(session, transaction, user_id)
+        db_transaction.account  # la respuesta incluye la cuenta: la cargamos acá
+        return db_transaction
+    return await db.run_sync(_create)
+
+async def get_transactions_by_user(db: AsyncSession, user_id: int, **filters):
+    return await db.run_sync(crud.get_transactions_by_user, user_id, **filters)
+
+# --- ANALYTICS ---
+async def get_monthly_cashflow(db: AsyncSession, user_id: int, months: int = 6):
+    return await db.run_sync(crud.get_monthly_cashflow, user_id, months)
+
+async def get_dashboard_summary(db: AsyncSession, user_id: int, month=None):
+    return await db.run_sync(crud.get_dashboard_summary, user_id, month)
+
+# --- SUSCRIPCIONES, TARJETAS Y METAS ---
+async def get_subscriptions(db: AsyncSession, user_id: int):
+    result = await db.execute(select(models.Subscription).where(models.Subscription.user_id == user_id))
+    return result.scalars().all()
+
+async def get_credit_cards(db: AsyncSession, user_id: int):
+    result = await db.execute(select(models.CreditCard).where(models.CreditCard.user_id == user_id))
+    return result.scalars().all()
+
+async def get_card_purchases(db: AsyncSession, card_id: int):
+    result = await db.execute(select(models.CardPurchase).where(models.CardPurchase.card_id == card_id))
+    return result.scalars().all()
+
+async def get_goals(db: AsyncSession, user_id: int):
+    result = await db.execute(select(models.Goal).where(models.Goal.user_id == user_id))
+    return result.scalars().all()
+
+# --- CLIENTES ---
+async def get_clients(db: AsyncSession, user_id: int, include_jobs: bool = False):
+    return await db.run_sync(crud.get_clients, user_id, include_jobs)
+
+async def get_top_clients(db: AsyncSession, user_id: int, limit: int = 5):
+    return await db.run_sync(crud.get_top_clients, user_id, limit)
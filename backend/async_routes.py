@@ -0,0 +1,109 @@
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+import schemas, crud, async_crud, versions
+from database import get_async_db
+from auth import get_current_user_async
+
+
+# --- RUTAS ASYNC (ASYNC_DB=1) ---
+# Versiones "async def" de los endpoints más usados. main.py incluye este
+# router ANTES de declarar sus rutas, así FastAPI matchea primero estas y
+# las sync quedan solo como respaldo. Mismos paths, mismos parámetros.
+router = APIRouter()
+
+
+@router.post("/users/{user_id}/transactions/", response_model=schemas.TransactionCreated)
+async def create_transaction_async(user_id: int, transaction: schemas.TransactionCreate,
+                                   db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await async_crud.create_transaction(db, transaction=transaction, user_id=user_id)
+    except LookupError:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Cuenta no encontrada")
+
+@router.get("/users/{user_id}/accounts/", response_model=List[schemas.AccountResponse],
+            dependencies=[Depends(versions.check_etag_async)])
+async def read_accounts_async(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_accounts(db, user_id=user_id)
+
+@router.get("/users/{user_id}/transactions/", response_model=List[schemas.TransactionResponse],
+            dependencies=[Depends(versions.check_etag_async)])
+async def read_transactions_async(
+    user_id: int,
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    account_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        transactions = await async_crud.get_transactions_by_user(
+            db, user_id, skip=skip, limit=limit, cursor=cursor,
+            date_from=date_from, date_to=date_to,
+            account_id=account_id, category_id=category_id,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if len(transactions) == limit:
+        last = transactions[-1]
+        response.headers["X-Next-Cursor"] = crud.encode_cursor(last.date, last.id)
+    return transactions
+
+@router.get("/users/{user_id}/analytics/cashflow", response_model=List[schemas.CashflowMonth])
+async def read_cashflow_async(user_id: int, months: int = Query(6, ge=1, le=120),
+                              db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_monthly_cashflow(db, user_id, months)
+
+@router.get("/users/{user_id}/dashboard", response_model=schemas.DashboardSummary)
+async def read_dashboard_async(user_id: int, month: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+                               db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_dashboard_summary(db, user_id, month)
+
+@router.get("/users/{user_id}/subscriptions/", response_model=List[schemas.SubscriptionResponse],
+            dependencies=[Depends(versions.check_etag_async)])
+async def read_subscriptions_async(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_subscriptions(db, user_id=user_id)
+
+@router.get("/users/{user_id}/credit-cards/", response_model=List[schemas.CreditCardResponse],
+            dependencies=[Depends(versions.check_etag_async)])
+async def read_credit_cards_async(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_credit_cards(db, user_id=user_id)
+
+@router.get("/credit-cards/{card_id}/purchases/", response_model=List[schemas.CardPurchaseResponse])
+async def read_card_purchases_async(card_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_card_purchases(db, card_id=card_id)
+
+@router.get("/users/{user_id}/categories/", response_model=List[schemas.CategoryResponse],
+            dependencies=[Depends(versions.check_etag_async)])
+async def read_categories_async(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_categories(db, user_id=user_id)
+
+@router.get("/users/{user_id}/clients/", response_model=List[schemas.ClientWithJobs], response_model_exclude_unset=True,
+            dependencies=[Depends(versions.check_etag_async)])
+async def read_clients_async(user_id: int, include: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    include_jobs = include == "jobs"
+    clients = await async_crud.get_clients(db, user_id, include_jobs)
+    if include_jobs:
+        return [schemas.ClientWithJobs.model_validate(c) for c in clients]
+    return [schemas.ClientResponse.model_validate(c) for c in clients]
+
+@router.get("/users/{user_id}/analytics/top-clients", response_model=List[schemas.ClientTotal])
+async def read_top_clients_async(user_id: int, limit: int = Query(5, ge=1, le=100),
+                                 db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_top_clients(db, user_id, limit)
+
+@router.get("/users/{user_id}/goals/", response_model=List[schemas.GoalResponse],
+            dependencies=[Depends(versions.check_etag_async)])
+async def read_goals_async(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_goals(db, user_id=user_id)
+
+@router.get("/users/me/", response_model=schemas.UserResponse)
+async def read_users_me_async(current_user: schemas.UserResponse = Depends(get_current_user_async)):
+    return current_user
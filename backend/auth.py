@@ -1,27 +1,27 @@
+import os
+import time
 from datetime import datetime, timedelta
 from typing import Union
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
-import crud, models, schemas
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud, async_crud, models, schemas, passwords
+from database import get_db, get_async_db
+from cache import make_cache
 
 # --- CONFIGURACIÓN ---
 SECRET_KEY = "tu_clave_secreta_super_segura_cambiala_en_produccion"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7 # 1 semana de sesión
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # --- UTILIDADES ---
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
+# El hashing vive en passwords.py (costo configurable y pool de procesos)
+verify_password = passwords.verify_password
+get_password_hash = passwords.hash_password
 
 def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None):
     to_encode = data.copy()
@@ -30,16 +30,37 @@ def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
+    from jose import jwt  # tardío: python-jose tarda en importar y no hace falta para arrancar
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# --- LÍMITE DE INTENTOS DE LOGIN (POR CUENTA) ---
+# Después de LOGIN_MAX_ATTEMPTS fallos dentro de la ventana, la cuenta queda
+# bloqueada hasta que venza el fallo más viejo. Ni siquiera se calcula bcrypt.
+LOGIN_MAX_ATTEMPTS = int(os.getenv("LOGIN_MAX_ATTEMPTS", 5))
+LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", 300))
+login_attempts = make_cache("login_attempts", maxsize=10000, ttl=LOGIN_WINDOW_SECONDS)
+
+def _recent_failures(email: str):
+    now = time.time()
+    return [t for t in (login_attempts.get(email) or []) if t > now - LOGIN_WINDOW_SECONDS]
+
+def login_retry_after(email: str) -> int:
+    # Segundos que faltan para poder reintentar (0 = puede intentar ya)
+    failures = _recent_failures(email)
+    if len(failures) < LOGIN_MAX_ATTEMPTS:
+        return 0
+    return max(1, int(failures[0] + LOGIN_WINDOW_SECONDS - time.time()) + 1)
+
+def register_failed_login(email: str):
+    login_attempts.set(email, _recent_failures(email) + [time.time()])
+
+def reset_login_attempts(email: str):
+    login_attempts.delete(email)
+
 # --- DEPENDENCIA PARA PROTEGER RUTAS ---
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="No se pudieron validar las credenciales",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def _email_from_token(token: str, credentials_exception: HTTPException) -> str:
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -47,8 +68,64 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
+    return email
+
+def _credentials_exception():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="No se pudieron validar las credenciales",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+# --- CACHÉ DE USUARIOS AUTENTICADOS ---
+# Guardamos un "principal" liviano (id, email, is_active) por email, así las
+# rutas protegidas no consultan la tabla users en cada request.
+user_cache = make_cache("users", maxsize=int(os.getenv("USER_CACHE_SIZE", 4096)),
+                        ttl=int(os.getenv("USER_CACHE_TTL", 300)))
+
+def _principal(user: models.User):
+    principal = schemas.UserResponse.model_validate(user)
+    user_cache.set(user.email, principal.model_dump())
+    return principal
+
+def invalidate_user(email: str):
+    user_cache.delete(email)
+
+# Si un usuario cambia o se borra (por cualquier camino), sale de la caché
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _user_changed(mapper, connection, target):
+    invalidate_user(target.email)
+    history = inspect(target).attrs.email.history
+    for old_email in history.deleted or ():
+        invalidate_user(old_email)
+
+# "def" y no "async def": la consulta es bloqueante, así FastAPI la corre
+# en el threadpool y no frena el event loop
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    credentials_exception = _credentials_exception()
+    email = _email_from_token(token, credentials_exception)
+
+    cached = user_cache.get(email)
+    if cached is not None:
+        return schemas.UserResponse(**cached)
+
     user = crud.get_user_by_email(db, email=email)
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    return _principal(user)
+
+# Versión para las rutas async (ASYNC_DB=1)
+async def get_current_user_async(token: str = Depends(oauth2_scheme),
+                                 db: AsyncSession = Depends(get_async_db)):
+    credentials_exception = _credentials_exception()
+    email = _email_from_token(token, credentials_exception)
+
+    cached = user_cache.get(email)
+    if cached is not None:
+        return schemas.UserResponse(**cached)
+
+    user = await async_crud.get_user_by_email(db, email=email)
+    if user is None:
+        raise credentials_exception
+    return _principal(user)
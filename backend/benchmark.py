@@ -0,0 +1,286 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+
+# --- BENCHMARK DE ENDPOINTS ---
+# Carga un dataset sintético (por defecto 10k usuarios y 10M transacciones
+# en SQLite), le pega a cada GET de main.py con usuarios al azar y guarda en
+# JSON los p50/p99, las consultas por request y el plan (EXPLAIN) de cada
+# consulta. Con --baseline compara contra una corrida anterior y marca lo
+# que empeoró: más latencia o un full scan nuevo.
+#
+#   python benchmark.py --users 1000 --transactions 200000 --out bench.json
+#   python benchmark.py --users 1000 --transactions 200000 --baseline bench.json
+#
+# Si la base ya tiene usuarios no se vuelve a cargar (--reset la borra).
+
+BATCH_SIZE = 20000
+HASH = "$2b$12$benchmarkbenchmarkbenchmarkbenchmarkbenchmarkbenchmar"  # no se usa para loguear
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de endpoints con datos sintéticos")
+    parser.add_argument("--database-url", default="sqlite:///./benchmark.db")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--transactions", type=int, default=10_000_000)
+    parser.add_argument("--requests", type=int, default=200, help="requests por endpoint")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="benchmark.json")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="cuánto puede subir el p99 (0.2 = 20%%)")
+    parser.add_argument("--reset", action="store_true", help="borra la base SQLite antes de cargar")
+    return parser.parse_args()
+
+
+# --- DATASET SINTÉTICO ---
+def _insert(conn, table, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        conn.execute(table.insert(), rows[start:start + BATCH_SIZE])
+
+
+def seed(engine, users: int, transactions: int, rng: random.Random):
+    import database, models, rollup, statements
+    from models import to_money
+
+    today = date.today()
+    per_account = max(transactions // (users * 2), 1)
+    ids = {"account": 0, "transaction": 0, "card": 0, "purchase": 0, "client": 0}
+    started = time.perf_counter()
+
+    for first_user in range(1, users + 1, 500):
+        chunk = range(first_user, min(first_user + 500, users + 1))
+        rows = {name: [] for name in ("users", "accounts", "transactions", "ledger", "cards", "purchases",
+                                      "installments", "subscriptions", "clients", "jobs", "goals")}
+        for user_id in chunk:
+            rows["users"].append({"id": user_id, "email": f"bench{user_id}@example.com",
+                                  "hashed_password": HASH, "is_active": True})
+
+            for currency in ("ARS", "USD"):
+                ids["account"] += 1
+                account_id = ids["account"]
+                dates = sorted(today - timedelta(days=rng.randrange(730)) for _ in range(per_account))
+                running = to_money(0)
+                for on in dates:
+                    ids["transaction"] += 1
+                    amount = to_money(Decimal(rng.randrange(-50000, 80000)) / 100)
+                    running += amount
+                    rows["transactions"].append({"id": ids["transaction"], "amount": amount, "date": on,
+                                                 "description": "mov", "account_id": account_id,
+                                                 "category_id": rng.randrange(1, 7)})
+                    rows["ledger"].append({"account_id": account_id, "transaction_id": ids["transaction"],
+                                           "amount": amount, "balance_after": running, "date": on})
+                rows["accounts"].append({"id": account_id, "name": f"Cuenta {currency}", "balance": running,
+                                         "user_id": user_id, "currency": currency})
+
+            ids["card"] += 1
+            card_id, closing_day = ids["card"], rng.randrange(1, 29)
+            rows["cards"].append({"id": card_id, "name": "Visa", "limit": to_money(500000),
+                                  "closing_day": closing_day, "user_id": user_id})
+            for _ in range(5):
+                ids["purchase"] += 1
+                on = today - timedelta(days=rng.randrange(365))
+                installments = rng.choice([1, 3, 6, 12])
+                amount = to_money(Decimal(rng.randrange(1000, 90000)) / 100)
+                rows["purchases"].append({"id": ids["purchase"], "description": "compra", "amount": amount,
+                                          "currency": "ARS", "installments": installments, "date": on,
+                                          "is_recurring": False, "card_id": card_id})
+                start = statements.first_period(on, closing_day)
+                for n in range(installments):
+                    rows["installments"].append({"purchase_id": ids["purchase"], "card_id": card_id,
+                                                 "period": statements._add_months(start, n), "number": n + 1,
+                                                 "amount": amount, "currency": "ARS"})
+            for name in ("Streaming", "Música"):
+                rows["subscriptions"].append({"name": name, "price": to_money(rng.randrange(5, 20)),
+                                              "currency": "USD", "billing_day": rng.randrange(1, 29),
+                                              "user_id": user_id, "card_id": card_id})
+
+            for _ in range(2):
+                ids["client"] += 1
+                rows["clients"].append({"id": ids["client"], "name": f"Cliente {ids['client']}", "user_id": user_id})
+                for _ in range(5):
+                    rows["jobs"].append({"description": "trabajo", "amount": to_money(rng.randrange(100, 5000)),
+                                         "is_paid": rng.random() < 0.7, "currency": "USD", "client_id": ids["client"],
+                                         "date": today - timedelta(days=rng.randrange(365))})
+            rows["goals"].append({"name": "Ahorro", "target_amount": to_money(100000), "current_amount": to_money(0),
+                                  "currency": "ARS", "user_id": user_id})
+
+        with engine.begin() as conn:
+            _insert(conn, models.User.__table__, rows["users"])
+            _insert(conn, models.Account.__table__, rows["accounts"])
+            _insert(conn, models.Transaction.__table__, rows["transactions"])
+            _insert(conn, models.LedgerEntry.__table__, rows["ledger"])
+            _insert(conn, models.CreditCard.__table__, rows["cards"])
+            _insert(conn, models.CardPurchase.__table__, rows["purchases"])
+            _insert(conn, models.CardInstallment.__table__, rows["installments"])
+            _insert(conn, models.Subscription.__table__, rows["subscriptions"])
+            _insert(conn, models.Client.__table__, rows["clients"])
+            _insert(conn, models.Job.__table__, rows["jobs"])
+            _insert(conn, models.Goal.__table__, rows["goals"])
+        print(f"  usuarios {chunk[-1]}/{users} ({time.perf_counter() - started:.0f} s)")
+
+    db = database.SessionLocal()
+    try:
+        rollup.rebuild(db)
+    finally:
+        db.close()
+
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+
+
+# --- PLANES Y LATENCIAS ---
+def explain(engine, statement, parameters):
+    if engine.dialect.name == "sqlite":
+        sql, detail_index = "EXPLAIN QUERY PLAN " + statement, 3
+    else:
+        sql, detail_index = "EXPLAIN " + statement, 0
+    with engine.connect() as conn:
+        return [str(row[detail_index]) for row in conn.exec_driver_sql(sql, parameters).fetchall()]
+
+
+def full_scans(plan):
+    # Líneas del plan que recorren una tabla entera
+    return [line.strip() for line in plan
+            if (line.strip().startswith("SCAN ") and "CONSTANT ROW" not in line) or "Seq Scan" in line]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def endpoints(app):
+    skip = {"/health", "/users/me/", "/openapi.json", "/docs", "/docs/oauth2-redirect", "/redoc"}
+    for route in app.routes:
+        if "GET" in getattr(route, "methods", ()) and route.path not in skip:
+            yield route.path
+
+
+def pick_params(engine, rng, users):
+    import models
+    from sqlalchemy import select
+
+    user_id = rng.randrange(1, users + 1)
+    with engine.connect() as conn:
+        def first(column, owner):
+            return conn.execute(select(column).where(owner == user_id).limit(1)).scalar()
+        return {
+            "user_id": user_id,
+            "account_id": first(models.Account.id, models.Account.user_id),
+            "card_id": first(models.CreditCard.id, models.CreditCard.user_id),
+            "client_id": first(models.Client.id, models.Client.user_id),
+        }
+
+
+def run(args):
+    import database, init_db
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, func, select
+    import models
+
+    engine = database.engine
+    rng = random.Random(args.seed)
+
+    init_db.bootstrap(engine)
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(models.User.__table__)).scalar()
+    if existing:
+        users = existing
+        print(f"Usando el dataset existente ({users} usuarios)")
+    else:
+        users = args.users
+        print(f"Cargando {users} usuarios y {args.transactions} transacciones...")
+        seed(engine, users, args.transactions, rng)
+
+    import main  # después de cargar los datos, así el arranque se mide solo
+
+    captured = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, parameters, context, executemany:
+                 captured.append((statement, parameters, executemany)))
+
+    results = {}
+    with TestClient(main.app) as client:
+        for path in endpoints(main.app):
+            latencies, queries, plans = [], [], {}
+            for n in range(args.requests):
+                params = pick_params(engine, rng, users)
+                url = path.format(**params)
+                captured.clear()
+                started = time.perf_counter()
+                response = client.get(url)
+                latencies.append((time.perf_counter() - started) * 1000)
+                queries.append(len(captured))
+                if n == 0:
+                    if response.status_code >= 400:
+                        print(f"  {path}: HTTP {response.status_code}")
+                    for statement, parameters, executemany in list(captured):
+                        if not executemany and statement.lstrip().upper().startswith("SELECT"):
+                            plans[statement] = explain(engine, statement, parameters)
+
+            results[path] = {
+                "p50_ms": round(percentile(latencies, 0.50), 2),
+                "p99_ms": round(percentile(latencies, 0.99), 2),
+                "mean_ms": round(statistics.mean(latencies), 2),
+                "queries": round(statistics.mean(queries), 1),
+                "plans": [{"sql": sql, "plan": plan} for sql, plan in plans.items()],
+                "full_scans": sorted({scan for plan in plans.values() for scan in full_scans(plan)}),
+            }
+            print(f"  {path:45} p50 {results[path]['p50_ms']:8.2f} ms  p99 {results[path]['p99_ms']:8.2f} ms"
+                  f"  queries {results[path]['queries']:4}  scans {len(results[path]['full_scans'])}")
+
+    report = {
+        "meta": {"database": engine.dialect.name, "users": users, "requests": args.requests,
+                 "date": date.today().isoformat()},
+        "endpoints": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados en {args.out}")
+
+    if args.baseline:
+        return compare(report, args.baseline, args.tolerance)
+    return 0
+
+
+def compare(report, baseline_path, tolerance):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["endpoints"]
+
+    regressions = []
+    for path, current in report["endpoints"].items():
+        before = baseline.get(path)
+        if before is None:
+            continue
+        if current["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{path}: p99 {before['p99_ms']} -> {current['p99_ms']} ms")
+        if current["queries"] > before["queries"]:
+            regressions.append(f"{path}: consultas {before['queries']} -> {current['queries']}")
+        for scan in set(current["full_scans"]) - set(before["full_scans"]):
+            regressions.append(f"{path}: full scan nuevo ({scan})")
+
+    for line in regressions:
+        print(f"REGRESIÓN {line}")
+    if not regressions:
+        print("Sin regresiones contra la corrida anterior")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.reset and args.database_url.startswith("sqlite:///"):
+        path = args.database_url[len("sqlite:///"):]
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    # Antes de importar la app: database.py lee la URL al importarse
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("RECURRING_SCHEDULER", "0")
+    raise SystemExit(run(args))
@@ -0,0 +1,92 @@
+import os
+from datetime import date
+from typing import Optional
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+import models
+from models import to_money
+
+
+# --- PRESUPUESTOS POR CATEGORÍA ---
+# Un presupuesto es un tope mensual por (categoría, moneda). Lo consumido sale
+# de la celda del mes en monthly_category_totals (egresos + cuotas de
+# tarjeta), que rollup.py mantiene al día en cada escritura: evaluar un
+# presupuesto es un solo lookup por clave, sin sumar transacciones.
+# Cada alta de transacción o compra con tarjeta devuelve el estado del
+# presupuesto que tocó, así el front puede avisar en el momento.
+
+WARNING_RATIO = float(os.getenv("BUDGET_WARNING_RATIO", 0.8))
+
+
+def _status(budget, month: str, expense, card_expense):
+    spent = to_money(expense) + to_money(card_expense)
+    limit = to_money(budget.limit)
+    ratio = float(spent / limit) if limit else 0.0
+    if spent > limit:
+        state = "exceeded"
+    elif ratio >= WARNING_RATIO:
+        state = "warning"
+    else:
+        state = "ok"
+    return {
+        "budget_id": budget.id,
+        "category_id": budget.category_id,
+        "currency": budget.currency,
+        "month": month,
+        "limit": float(limit),
+        "spent": float(spent),
+        "remaining": float(limit - spent),
+        "percent": round(ratio * 100, 1),
+        "status": state,
+    }
+
+
+def _with_usage(db: Session, month: str):
+    budget, totals = models.Budget, models.MonthlyCategoryTotal
+    return db.query(budget, totals.expense, totals.card_expense)\
+             .outerjoin(totals, and_(totals.user_id == budget.user_id,
+                                     totals.category_id == budget.category_id,
+                                     totals.currency == budget.currency,
+                                     totals.month == month))
+
+
+def status(db: Session, user_id: int, category_id: Optional[int], currency: str, month: str):
+    # Estado del presupuesto que toca una escritura en "month" (None si no hay presupuesto).
+    # Para una compra con tarjeta es el mes del resumen donde cae, no el de la fecha de compra
+    if category_id is None:
+        return None
+    row = _with_usage(db, month)\
+        .filter(models.Budget.user_id == user_id,
+                models.Budget.category_id == category_id,
+                models.Budget.currency == currency)\
+        .first()
+    if row is None:
+        return None
+    return _status(row[0], month, row[1], row[2])
+
+
+def list_status(db: Session, user_id: int, month: Optional[str] = None):
+    month = month or date.today().strftime("%Y-%m")
+    rows = _with_usage(db, month)\
+        .filter(models.Budget.user_id == user_id)\
+        .order_by(models.Budget.category_id, models.Budget.currency)\
+        .all()
+    return [_status(budget, month, expense, card_expense) for budget, expense, card_expense in rows]
+
+
+def set_budget(db: Session, user_id: int, category_id: int, currency: str, limit):
+    # Alta o cambio del tope (uno por categoría y moneda); la categoría tiene que
+    # ser global o del usuario
+    category = db.get(models.Category, category_id)
+    if category is None or category.user_id not in (None, user_id):
+        raise LookupError("Categoría no encontrada")
+    budget = db.query(models.Budget)\
+               .filter_by(user_id=user_id, category_id=category_id, currency=currency)\
+               .first()
+    if budget is None:
+        budget = models.Budget(user_id=user_id, category_id=category_id, currency=currency)
+        db.add(budget)
+    budget.limit = to_money(limit)
+    db.commit()
+    db.refresh(budget)
+    return budget
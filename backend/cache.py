@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+# --- CACHÉ ---
+# Caché en memoria del proceso con TTL y desalojo LRU. Si está REDIS_URL se
+# puede usar Redis como backend compartido entre workers (mismos métodos).
+# Los valores tienen que ser serializables a JSON (dicts, listas, números).
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, ttl: float = None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {"backend": "memory", "size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class RedisCache:
+    def __init__(self, url: str, namespace: str, ttl: float = 300):
+        import redis  # opcional: solo hace falta si se configura REDIS_URL
+
+        self._client = redis.Redis.from_url(url)
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get(self, key):
+        raw = self._client.get(self._key(key))
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl: float = None):
+        self._client.set(self._key(key), json.dumps(value), ex=int(ttl or self.ttl))
+
+    def delete(self, key):
+        self._client.delete(self._key(key))
+
+    def clear(self):
+        for key in self._client.scan_iter(f"{self.namespace}:*"):
+            self._client.delete(key)
+
+    def stats(self):
+        return {"backend": "redis", "namespace": self.namespace}
+
+
+def make_cache(namespace: str, maxsize: int = 1024, ttl: float = 300):
+    # CACHE_BACKEND=redis + REDIS_URL para compartir la caché entre procesos
+    redis_url = os.getenv("REDIS_URL")
+    if os.getenv("CACHE_BACKEND", "memory") == "redis" and redis_url:
+        return RedisCache(redis_url, namespace, ttl=ttl)
+    return TTLCache(maxsize=maxsize, ttl=ttl)
@@ -1,12 +1,18 @@
-from sqlalchemy.orm import Session, joinedload
-import models, schemas
+from sqlalchemy import func, case, or_, and_
+from sqlalchemy.orm import Session, joinedload, selectinload
+from datetime import date, timedelta
+from typing import Optional
+import base64, json, os
+import models, schemas, ledger, passwords, statements, recurring, rollup, budgets, versions
+from models import to_money
+from cache import make_cache
 
 
 # --- USUARIOS ---
-def create_user(db: Session, user: schemas.UserCreate):
-    from auth import get_password_hash
-    # ENCRIPTAMOS LA CONTRASEÑA ANTES DE GUARDAR
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None):
+    # ENCRIPTAMOS LA CONTRASEÑA ANTES DE GUARDAR (si no viene ya calculada)
+    if hashed_password is None:
+        hashed_password = passwords.hash_password(user.password)
     db_user = models.User(email=user.email, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
@@ -16,10 +22,18 @@ def create_user(db: Session, user: schemas.UserCreate):
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
+def update_password_hash(db: Session, user: models.User, hashed_password: str):
+    user.hashed_password = hashed_password
+    db.commit()
+
 # --- CUENTAS ---
 def create_account(db: Session, account: schemas.AccountCreate, user_id: int):
-    db_account = models.Account(**account.dict(), user_id=user_id)
+    # Arranca en 0 y el saldo inicial entra como asiento de apertura en el ledger
+    db_account = models.Account(**account.dict(exclude={"balance"}), balance=0, user_id=user_id)
     db.add(db_account)
+    db.flush()
+    if account.balance:
+        ledger.post(db, db_account.id, account.balance)
     db.commit()
     db.refresh(db_account)
     return db_account
@@ -27,19 +41,25 @@ def create_account(db: Session, account: schemas.AccountCreate, user_id: int):
 # --- TRANSACCIONES ---
 def create_transaction(db: Session, transaction: schemas.TransactionCreate, user_id: int):
     # 1. Creamos la transacción (SIN user_id, porque ya tiene account_id)
-    db_transaction = models.Transaction(**transaction.dict())
-    
+    data = transaction.dict()
+    data["amount"] = to_money(transaction.amount)
+    data["date"] = transaction.date or date.today()
+    db_transaction = models.Transaction(**data)
     db.add(db_transaction)
+    db.flush()
+
+    # 2. Actualizamos el saldo de la cuenta con un asiento en el ledger
+    # (UPDATE atómico, sin leer-modificar-escribir desde Python)
+    ledger.post(db, transaction.account_id, db_transaction.amount,
+                on=db_transaction.date, transaction_id=db_transaction.id)
+
     db.commit()
     db.refresh(db_transaction)
 
-    # 2. Actualizamos el saldo de la cuenta automáticamente
-    # Buscamos la cuenta afectada
-    account = db.query(models.Account).filter(models.Account.id == transaction.account_id).first()
-    if account:
-        account.balance += transaction.amount # Sumamos (o restamos si es negativo)
-        db.commit() # Guardamos el nuevo saldo
-    
+    # 3. Estado del presupuesto de la categoría (un lookup sobre el resumen mensual)
+    account = db_transaction.account
+    db_transaction.budget = budgets.status(db, account.user_id, db_transaction.category_id,
+                                           account.currency, db_transaction.date.strftime("%Y-%m"))
     return db_transaction
 
 def create_category(db: Session, category: schemas.CategoryCreate):
@@ -47,16 +67,215 @@ def create_category(db: Session, category: schemas.CategoryCreate):
     db.add(db_category)
     db.commit()
     db.refresh(db_category)
+    invalidate_categories(db_category.user_id)
     return db_category
 
-def get_transactions_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Transaction)\
-             .options(joinedload(models.Transaction.account))\
-             .join(models.Account)\
-             .filter(models.Account.user_id == user_id)\
-             .offset(skip)\
-             .limit(limit)\
-             .all()
+# --- CACHÉ DE CATEGORÍAS ---
+# Las globales (user_id NULL) se cargan al arrancar y quedan en memoria del
+# proceso; las propias de cada usuario van en una caché por user_id. Las dos
+# guardan dicts ya serializados junto con la versión de datos (versions.py)
+# con la que se leyeron: si la versión actual es otra (por ejemplo, otro
+# worker creó o borró una categoría) se vuelven a leer. Así el cuerpo nunca
+# queda atrás del ETag, que sale de la misma versión.
+category_cache = make_cache("categories", maxsize=int(os.getenv("CATEGORY_CACHE_SIZE", 4096)),
+                            ttl=int(os.getenv("CATEGORY_CACHE_TTL", 300)))
+_global_categories = None  # (versión global, lista)
+
+def _category_dicts(rows):
+    return [schemas.CategoryResponse.model_validate(c).model_dump() for c in rows]
+
+def load_global_categories(db: Session, version: Optional[int] = None):
+    global _global_categories
+    if version is None:
+        _, version = versions.get(db, versions.GLOBAL)
+    rows = db.query(models.Category).filter(models.Category.user_id == None).order_by(models.Category.id).all()
+    _global_categories = (version, _category_dicts(rows))
+    return _global_categories[1]
+
+def get_global_categories(db: Session, version: Optional[int] = None):
+    if version is None:
+        _, version = versions.get(db, versions.GLOBAL)
+    cached = _global_categories
+    if cached is None or cached[0] != version:
+        return load_global_categories(db, version)
+    return cached[1]
+
+def get_user_categories(db: Session, user_id: int):
+    version, global_version = versions.get(db, user_id)
+    own = category_cache.get(user_id)
+    if own is None or own["version"] != version:
+        rows = db.query(models.Category).filter(models.Category.user_id == user_id).all()
+        own = {"version": version, "items": _category_dicts(rows)}
+        category_cache.set(user_id, own)
+    return sorted(get_global_categories(db, global_version) + own["items"], key=lambda c: c["id"])
+
+def invalidate_categories(user_id: Optional[int] = None):
+    global _global_categories
+    if user_id is None:
+        _global_categories = None
+    else:
+        category_cache.delete(user_id)
+
+def encode_cursor(date_value, transaction_id: int) -> str:
+    # Cursor opaco: base64 de (fecha, id) de la última fila de la página
+    raw = json.dumps([str(date_value), transaction_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    # Devuelve (fecha, id) o lanza ValueError si el cursor no es válido
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        date_value, transaction_id = json.loads(raw)
+        return date.fromisoformat(date_value), int(transaction_id)
+    except Exception as e:
+        raise ValueError("Cursor inválido") from e
+
+def get_transactions_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100,
+                             cursor: Optional[str] = None, date_from: Optional[date] = None,
+                             date_to: Optional[date] = None, account_id: Optional[int] = None,
+                             category_id: Optional[int] = None):
+    query = db.query(models.Transaction)\
+              .options(joinedload(models.Transaction.account))\
+              .join(models.Account)\
+              .filter(models.Account.user_id == user_id)
+    return _page_transactions(query, skip, limit, cursor, date_from, date_to, account_id, category_id)
+
+SLIM_COLUMNS = (
+    models.Transaction.id,
+    models.Transaction.amount,
+    models.Transaction.description,
+    models.Transaction.date,
+    models.Transaction.category_id,
+    models.Transaction.account_id,
+)
+
+def get_transactions_slim(db: Session, user_id: int, skip: int = 0, limit: int = 100,
+                          cursor: Optional[str] = None, date_from: Optional[date] = None,
+                          date_to: Optional[date] = None, account_id: Optional[int] = None,
+                          category_id: Optional[int] = None):
+    # Mismos filtros, pero solo columnas (sin objetos ORM) y las cuentas aparte
+    query = db.query(*SLIM_COLUMNS)\
+              .join(models.Account, models.Transaction.account_id == models.Account.id)\
+              .filter(models.Account.user_id == user_id)
+    rows = _page_transactions(query, skip, limit, cursor, date_from, date_to, account_id, category_id)
+
+    account_ids = {row.account_id for row in rows}
+    accounts = db.query(models.Account).filter(models.Account.id.in_(account_ids)).all() if account_ids else []
+    return rows, accounts
+
+def _page_transactions(query, skip, limit, cursor, date_from, date_to, account_id, category_id):
+    if account_id is not None:
+        query = query.filter(models.Transaction.account_id == account_id)
+    if category_id is not None:
+        query = query.filter(models.Transaction.category_id == category_id)
+    if date_from:
+        query = query.filter(models.Transaction.date >= date_from)
+    if date_to:
+        query = query.filter(models.Transaction.date <= date_to)
+
+    # Orden estable (más nuevas primero) para que las páginas no se pisen
+    query = query.order_by(models.Transaction.date.desc(), models.Transaction.id.desc())
+
+    if cursor:
+        last_date, last_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            models.Transaction.date < last_date,
+            and_(models.Transaction.date == last_date, models.Transaction.id < last_id),
+        ))
+    else:
+        query = query.offset(skip)
+
+    return query.limit(limit).all()
+
+# --- ANALYTICS ---
+def _months_back(months: int, end: Optional[date] = None) -> date:
+    # Primer día del mes de hace (months - 1) meses (contando desde "end" o desde hoy)
+    today = end - timedelta(days=1) if end else date.today()
+    total = today.year * 12 + (today.month - 1) - (months - 1)
+    return date(total // 12, total % 12 + 1, 1)
+
+def month_of(db: Session, column):
+    # "YYYY-MM" de una columna Date, según el motor
+    if db.get_bind().dialect.name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+def get_monthly_cashflow(db: Session, user_id: int, months: int = 6,
+                         end: Optional[date] = None):
+    # Agrupamos en SQL por mes y moneda, así no viajan todas las transacciones al cliente
+    month = month_of(db, models.Transaction.date)
+    income = func.sum(case((models.Transaction.amount > 0, models.Transaction.amount), else_=0))
+    expense = func.sum(case((models.Transaction.amount < 0, -models.Transaction.amount), else_=0))
+
+    query = db.query(month.label("month"), models.Account.currency, income, expense)\
+              .join(models.Account, models.Transaction.account_id == models.Account.id)\
+              .filter(models.Account.user_id == user_id)\
+              .filter(models.Transaction.date >= _months_back(months, end))
+    if end is not None:
+        query = query.filter(models.Transaction.date < end)
+
+    rows = query.group_by(month, models.Account.currency)\
+                .order_by(month, models.Account.currency)\
+                .all()
+
+    return [
+        {"month": m, "currency": currency, "income": float(inc or 0), "expense": float(exp or 0),
+         "net": float((inc or 0) - (exp or 0))}
+        for m, currency, inc, exp in rows
+    ]
+
+def _month_range(month: str):
+    # "YYYY-MM" -> (primer día del mes, primer día del mes siguiente)
+    start = date.fromisoformat(f"{month}-01")
+    end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+DASHBOARD_HISTORY_MONTHS = 6
+DASHBOARD_TRANSACTIONS = 100  # movimientos del mes que viajan con el resumen
+
+def get_dashboard_summary(db: Session, user_id: int, month: Optional[str] = None):
+    month = month or date.today().strftime("%Y-%m")
+    start, end = _month_range(month)
+
+    accounts = db.query(models.Account).filter(models.Account.user_id == user_id).all()
+
+    # Saldos por moneda
+    balances = db.query(models.Account.currency, func.sum(models.Account.balance))\
+                 .filter(models.Account.user_id == user_id)\
+                 .group_by(models.Account.currency)\
+                 .order_by(models.Account.currency)\
+                 .all()
+
+    # Gastos del mes por categoría (y moneda, no se mezclan pesos con dólares):
+    # salen del resumen mensual de rollup.py, no de recorrer transactions
+    totals = models.MonthlyCategoryTotal
+    by_category = db.query(totals.category_id, models.Category.name, totals.currency, totals.expense)\
+                    .outerjoin(models.Category, totals.category_id == models.Category.id)\
+                    .filter(totals.user_id == user_id, totals.month == month, totals.expense > 0)\
+                    .order_by(totals.expense.desc())\
+                    .all()
+
+    # Últimos movimientos del mes (solo columnas, más nuevos primero)
+    transactions = db.query(*SLIM_COLUMNS)\
+                     .join(models.Account, models.Transaction.account_id == models.Account.id)\
+                     .filter(models.Account.user_id == user_id)
+    transactions = _page_transactions(transactions, 0, DASHBOARD_TRANSACTIONS, None, start,
+                                      end - timedelta(days=1), None, None)
+
+    history = get_monthly_cashflow(db, user_id, months=DASHBOARD_HISTORY_MONTHS, end=end)
+    return {
+        "month": month,
+        "accounts": accounts,
+        "balances": [{"currency": c, "balance": float(b or 0)} for c, b in balances],
+        "cashflow": [row for row in history if row["month"] == month],
+        "history": history,
+        "transactions": transactions,
+        "category_list": get_user_categories(db, user_id),
+        "categories": [
+            {"category_id": cid or None, "name": name, "currency": c, "total": float(total or 0)}
+            for cid, name, c, total in by_category
+        ],
+    }
 
 def get_subscriptions(db: Session, user_id: int):
     return db.query(models.Subscription).filter(models.Subscription.user_id == user_id).all()
@@ -64,6 +283,9 @@ def get_subscriptions(db: Session, user_id: int):
 def create_subscription(db: Session, subscription: schemas.SubscriptionCreate, user_id: int):
     db_subscription = models.Subscription(**subscription.dict(), user_id=user_id)
     db.add(db_subscription)
+    db.flush()
+    # Si eligió una tarjeta, el primer cobro sale hoy; los siguientes los genera el job
+    recurring.charge_now(db, db_subscription)
     db.commit()
     db.refresh(db_subscription)
     return db_subscription
@@ -82,9 +304,19 @@ def get_credit_cards(db: Session, user_id: int):
 
 def create_card_purchase(db: Session, purchase: schemas.CardPurchaseCreate, card_id: int):
     db_purchase = models.CardPurchase(**purchase.dict(), card_id=card_id)
+    db_purchase.amount = to_money(purchase.amount)
     db.add(db_purchase)
+
+    # Dejamos calculadas las cuotas (en qué resumen cae cada una)
+    card = db.get(models.CreditCard, card_id)
+    owner = card.user_id if card else None
+    statements.materialize(db, db_purchase, card.closing_day if card else None)
     db.commit()
     db.refresh(db_purchase)
+
+    if owner is not None:
+        db_purchase.budget = budgets.status(db, owner, db_purchase.category_id, db_purchase.currency,
+                                            statements.first_period(db_purchase.date, card.closing_day))
     return db_purchase
 
 def get_card_purchases(db: Session, card_id: int):
@@ -93,6 +325,11 @@ def get_card_purchases(db: Session, card_id: int):
 def delete_card_purchase(db: Session, purchase_id: int):
     purchase = db.query(models.CardPurchase).filter(models.CardPurchase.id == purchase_id).first()
     if purchase:
+        # El cobro de suscripción que la generó queda registrado, pero sin compra
+        # (las bases ya creadas no tienen el ON DELETE SET NULL en la FK)
+        db.query(models.SubscriptionCharge)\
+          .filter(models.SubscriptionCharge.purchase_id == purchase_id)\
+          .update({models.SubscriptionCharge.purchase_id: None}, synchronize_session=False)
         db.delete(purchase)
         db.commit()
         return True
@@ -109,8 +346,27 @@ def create_client(db: Session, client: schemas.ClientCreate, user_id: int):
     db.refresh(db_client)
     return db_client
 
-def get_clients(db: Session, user_id: int):
-    return db.query(models.Client).filter(models.Client.user_id == user_id).all()
+def get_clients(db: Session, user_id: int, include_jobs: bool = False):
+    query = db.query(models.Client).filter(models.Client.user_id == user_id)
+    if include_jobs:
+        # Un solo SELECT ... WHERE client_id IN (...) para todos los trabajos
+        query = query.options(selectinload(models.Client.jobs))
+    return query.all()
+
+def get_top_clients(db: Session, user_id: int, limit: int = 5):
+    # Ranking por lo cobrado (trabajos pagos), separado por moneda
+    total = func.sum(models.Job.amount)
+    rows = db.query(models.Client.id, models.Client.name, models.Job.currency, total, func.count(models.Job.id))\
+             .join(models.Job, models.Job.client_id == models.Client.id)\
+             .filter(models.Client.user_id == user_id, models.Job.is_paid == True)\
+             .group_by(models.Client.id, models.Client.name, models.Job.currency)\
+             .order_by(total.desc())\
+             .limit(limit)\
+             .all()
+    return [
+        {"client_id": cid, "name": name, "currency": currency, "total": float(t or 0), "jobs_paid": n}
+        for cid, name, currency, t, n in rows
+    ]
 
 # --- TRABAJOS ---
 def create_job(db: Session, job: schemas.JobCreate, client_id: int):
@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -12,11 +12,43 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
 if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+# --- POOL DE CONEXIONES (configurable por variables de entorno) ---
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+POOL_OPTIONS = {
+    "pool_size": _env_int("DB_POOL_SIZE", 5),
+    "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+    "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+    # Render corta conexiones inactivas: las reciclamos antes y las probamos al sacarlas
+    "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+}
+
+# --- SQLITE: WAL Y PRAGMAS ---
+# WAL deja leer mientras otro escribe y busy_timeout espera en vez de tirar
+# "database is locked" de inmediato.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+    "mmap_size": _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+    "cache_size": _env_int("SQLITE_CACHE_SIZE", -16000),  # negativo = KiB
+}
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
 # Configuración híbrida
 if "sqlite" in SQLALCHEMY_DATABASE_URL:
     engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+    if ":memory:" not in SQLALCHEMY_DATABASE_URL:
+        event.listen(engine, "connect", _set_sqlite_pragmas)
 else:
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, **POOL_OPTIONS)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -27,4 +59,51 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# --- MODO ASYNC (OPCIONAL) ---
+# Con ASYNC_DB=1 se arma además un engine async (asyncpg en Postgres,
+# aiosqlite en local) y las rutas más usadas pasan a ser "async def".
+# El engine sync sigue existiendo para el resto de las rutas y los scripts.
+ASYNC_DB = os.getenv("ASYNC_DB", "0") == "1"
+
+def _async_url(url: str) -> str:
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+async_engine = None
+AsyncSessionLocal = None
+
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    if "sqlite" in SQLALCHEMY_DATABASE_URL:
+        async_engine = create_async_engine(_async_url(SQLALCHEMY_DATABASE_URL))
+        if ":memory:" not in SQLALCHEMY_DATABASE_URL:
+            event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    else:
+        async_engine = create_async_engine(_async_url(SQLALCHEMY_DATABASE_URL), **POOL_OPTIONS)
+    # expire_on_commit=False: en async no se puede recargar un atributo "lazy" al serializar
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# --- ESTADÍSTICAS DEL POOL (para monitoreo) ---
+def _stats(pool):
+    stats = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    return stats
+
+def pool_stats():
+    stats = {"sync": _stats(engine.pool)}
+    if async_engine is not None:
+        stats["async"] = _stats(async_engine.pool)
+    return stats
@@ -0,0 +1,85 @@
+import csv
+import io
+import json
+from database import SessionLocal
+import models
+
+
+# --- EXPORTACIÓN DEL HISTORIAL COMPLETO (CSV / NDJSON) ---
+# Se recorre la tabla con un cursor del lado del servidor (yield_per), así
+# exportar millones de filas usa memoria constante. El generador abre su
+# propia sesión porque se consume después de que termina el endpoint.
+
+BATCH_SIZE = 1000
+COLUMNS = ["id", "date", "amount", "currency", "description", "category_id", "account_id"]
+
+
+def _rows(user_id: int):
+    db = SessionLocal()
+    try:
+        query = db.query(
+            models.Transaction.id,
+            models.Transaction.date,
+            models.Transaction.amount,
+            models.Account.currency,
+            models.Transaction.description,
+            models.Transaction.category_id,
+            models.Transaction.account_id,
+        ).join(models.Account, models.Transaction.account_id == models.Account.id)\
+         .filter(models.Account.user_id == user_id)\
+         .order_by(models.Transaction.date, models.Transaction.id)\
+         .execution_options(yield_per=BATCH_SIZE)
+
+        for row in query:
+            yield row
+    finally:
+        db.close()
+
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_csv(user_id: int):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for batch in _batches(_rows(user_id)):
+        for t_id, t_date, amount, currency, description, category_id, account_id in batch:
+            writer.writerow([t_id, t_date.isoformat() if t_date else "", amount, currency,
+                             description or "", category_id, account_id])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    # Si no hubo filas igual mandamos el encabezado
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_ndjson(user_id: int):
+    for batch in _batches(_rows(user_id)):
+        yield "".join(
+            json.dumps({
+                "id": t_id,
+                "date": t_date.isoformat() if t_date else None,
+                "amount": float(amount) if amount is not None else None,
+                "currency": currency,
+                "description": description,
+                "category_id": category_id,
+                "account_id": account_id,
+            }, ensure_ascii=False) + "\n"
+            for t_id, t_date, amount, currency, description, category_id, account_id in batch
+        )
+
+
+FORMATS = {
+    "csv": (export_csv, "text/csv; charset=utf-8"),
+    "ndjson": (export_ndjson, "application/x-ndjson"),
+}
@@ -0,0 +1,154 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, Response
+from database import SessionLocal
+import models
+
+
+# --- IDEMPOTENCY-KEY EN LOS POST ---
+# Si el cliente manda el header Idempotency-Key, la primera respuesta se
+# guarda y los reintentos con la misma clave la reciben tal cual sin volver
+# a ejecutar la escritura (útil con conexiones móviles que cortan). Las
+# claves vencen a las IDEMPOTENCY_TTL_SECONDS y se borran de a poco.
+# Reusar una clave con otro body devuelve 422; si el original sigue en
+# curso, 409. La clave se guarda junto con quién llama (el "sub" del token,
+# o el header Authorization si no se puede leer), así dos usuarios que
+# mandan la misma clave no ven la respuesta del otro.
+
+HEADER = "Idempotency-Key"
+TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 24 * 3600))
+EVICT_EVERY = 100  # cada cuántas claves nuevas se limpian las vencidas
+EXCLUDED_PATHS = {"/token"}  # no guardamos tokens en la base
+
+_stored = 0
+
+
+def _digest(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _caller(request) -> str:
+    authorization = request.headers.get("Authorization")
+    if not authorization:
+        return ""
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        from auth import _credentials_exception, _email_from_token
+        try:
+            return "sub:" + _email_from_token(token, _credentials_exception())
+        except HTTPException:
+            pass
+    return "auth:" + _digest(authorization)
+
+
+def _now():
+    return datetime.utcnow()
+
+
+def reserve(key: str, fingerprint: str):
+    # Devuelve None si la clave quedó reservada para este pedido, o la fila existente
+    db = SessionLocal()
+    try:
+        existing = db.get(models.IdempotencyKey, key)
+        if existing is not None and existing.expires_at < _now():
+            db.delete(existing)
+            db.commit()
+            existing = None
+        if existing is not None:
+            db.expunge(existing)
+            return existing
+
+        db.add(models.IdempotencyKey(key=key, fingerprint=fingerprint,
+                                     expires_at=_now() + timedelta(seconds=TTL_SECONDS)))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Otro pedido con la misma clave la reservó primero
+            db.rollback()
+            existing = db.get(models.IdempotencyKey, key)
+            if existing is not None:
+                db.expunge(existing)
+            return existing
+        return None
+    finally:
+        db.close()
+
+
+def store(key: str, status_code: int, content_type: str, body: bytes):
+    global _stored
+    db = SessionLocal()
+    try:
+        db.query(models.IdempotencyKey).filter(models.IdempotencyKey.key == key).update({
+            "status_code": status_code,
+            "content_type": content_type,
+            "body": body.decode("utf-8", errors="replace"),
+        })
+        _stored += 1
+        if _stored % EVICT_EVERY == 0:
+            evict_expired(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+def release(key: str):
+    # El pedido falló del lado del server: liberamos la clave para que se pueda reintentar
+    db = SessionLocal()
+    try:
+        db.query(models.IdempotencyKey).filter(models.IdempotencyKey.key == key).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def evict_expired(db):
+    return db.query(models.IdempotencyKey)\
+             .filter(models.IdempotencyKey.expires_at < _now())\
+             .delete(synchronize_session=False)
+
+
+class IdempotencyMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        client_key = request.headers.get(HEADER)
+        if request.method != "POST" or not client_key or request.url.path in EXCLUDED_PATHS:
+            return await call_next(request)
+
+        key = _digest(_caller(request), client_key, request.method, request.url.path)
+        fingerprint = _digest(await request.body())
+
+        existing = await run_in_threadpool(reserve, key, fingerprint)
+        if existing is not None:
+            if existing.fingerprint != fingerprint:
+                return JSONResponse(status_code=422,
+                                    content={"detail": "Idempotency-Key ya usada con otro pedido"})
+            if existing.status_code is None:
+                return JSONResponse(status_code=409,
+                                    content={"detail": "El pedido original todavía está en curso"})
+            return Response(content=existing.body, status_code=existing.status_code,
+                            media_type=existing.content_type,
+                            headers={"Idempotent-Replayed": "true"})
+
+        try:
+            response = await call_next(request)
+        except Exception:
+            await run_in_threadpool(release, key)
+            raise
+
+        if response.status_code >= 500:
+            await run_in_threadpool(release, key)
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        await run_in_threadpool(store, key, response.status_code,
+                                response.headers.get("content-type"), body)
+        return Response(content=body, status_code=response.status_code,
+                        headers=dict(response.headers), media_type=response.media_type)
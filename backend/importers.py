@@ -0,0 +1,156 @@
+import csv
+import io
+import re
+from datetime import date, datetime
+from itertools import islice
+from typing import Optional
+from sqlalchemy import insert, or_
+from sqlalchemy.orm import Session
+import models, ledger, rollup
+from models import to_money
+
+
+# --- IMPORTACIÓN MASIVA DE TRANSACCIONES (CSV / OFX) ---
+# Los parsers son generadores: leen el archivo de a una línea y nunca lo
+# cargan entero en memoria. Cada fila sale como un dict con date, amount,
+# description y (opcionalmente) account_id / category_id.
+
+CHUNK_SIZE = 1000
+MAX_ERRORS = 50
+
+
+def _parse_amount(value: str):
+    value = value.strip().replace("$", "").replace(" ", "")
+    if not value:
+        raise ValueError("Monto vacío")
+    # "1.234,56" (formato argentino) o "1,234.56"
+    if "," in value and "." in value:
+        if value.rfind(",") > value.rfind("."):
+            value = value.replace(".", "").replace(",", ".")
+        else:
+            value = value.replace(",", "")
+    elif "," in value:
+        value = value.replace(",", ".")
+    try:
+        return to_money(value)
+    except ArithmeticError:
+        raise ValueError(f"Monto inválido: {value!r}")
+
+
+def _parse_id(value, default: Optional[int], label: str, allowed: set) -> int:
+    try:
+        result = int(value or default or 0)
+    except ValueError:
+        result = 0
+    if result not in allowed:
+        raise ValueError(f"{label} inválida: {value or default!r}")
+    return result
+
+
+def _parse_date(value: str) -> date:
+    value = value.strip()
+    # ISO, formato local y el de OFX ("20240115120000[-3:ART]")
+    for fmt, size in (("%Y-%m-%d", 10), ("%d/%m/%Y", 10), ("%Y%m%d", 8)):
+        try:
+            return datetime.strptime(value[:size], fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha inválida: {value!r}")
+
+
+def parse_csv(stream):
+    # Columnas: date, amount, description y opcionales account_id, category_id.
+    # Una fila cortada trae las columnas que faltan vacías y sale como error de esa fila
+    reader = csv.DictReader(stream, restval="")
+    for row in reader:
+        yield reader.line_num, {
+            "date": row.get("date") or "",
+            "amount": row.get("amount") or "",
+            "description": row.get("description") or None,
+            "account_id": row.get("account_id") or None,
+            "category_id": row.get("category_id") or None,
+        }
+
+
+OFX_TAG = re.compile(r"<(\w+)>([^<\r\n]*)")
+
+def parse_ofx(stream):
+    # OFX 1.x (SGML) no siempre cierra los tags: leemos tag por tag dentro de cada <STMTTRN>
+    current = None
+    for line_num, line in enumerate(stream, start=1):
+        for tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                current = {"line": line_num}
+            elif current is not None:
+                current[tag] = value.strip()
+        if current is not None and "</STMTTRN>" in line.upper():
+            yield current["line"], {
+                "date": current.get("DTPOSTED", ""),
+                "amount": current.get("TRNAMT", ""),
+                "description": current.get("MEMO") or current.get("NAME"),
+                "account_id": None,
+                "category_id": None,
+            }
+            current = None
+
+
+def parse(fileobj, fmt: str):
+    stream = io.TextIOWrapper(fileobj, encoding="utf-8-sig", errors="replace", newline="")
+    if fmt == "ofx":
+        return parse_ofx(stream)
+    return parse_csv(stream)
+
+
+def import_transactions(db: Session, user_id: int, rows, account_id: Optional[int] = None,
+                        category_id: Optional[int] = None, chunk_size: int = CHUNK_SIZE):
+    # Cuentas y categorías válidas para el usuario: se cargan una vez, no por fila
+    account_ids = {row[0] for row in db.query(models.Account.id).filter(models.Account.user_id == user_id)}
+    category_ids = {row[0] for row in db.query(models.Category.id).filter(
+        or_(models.Category.user_id == user_id, models.Category.user_id == None))}
+
+    imported, skipped, errors = 0, 0, []
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        # 1. Validamos el lote completo antes de tocar la base
+        valid = []
+        for line, raw in chunk:
+            try:
+                target_account = _parse_id(raw["account_id"], account_id, "Cuenta", account_ids)
+                target_category = _parse_id(raw["category_id"], category_id, "Categoría", category_ids)
+                valid.append({
+                    "amount": _parse_amount(raw["amount"]),
+                    "description": raw["description"],
+                    "date": _parse_date(raw["date"]),
+                    "account_id": target_account,
+                    "category_id": target_category,
+                })
+            except ValueError as e:
+                skipped += 1
+                if len(errors) < MAX_ERRORS:
+                    errors.append({"line": line, "error": str(e)})
+
+        if not valid:
+            continue
+
+        # 2. Un INSERT masivo por lote y un solo delta de saldo por cuenta
+        ids = db.execute(
+            insert(models.Transaction).returning(models.Transaction.id, sort_by_parameter_order=True),
+            valid,
+        ).scalars().all()
+
+        by_account = {}
+        for transaction_id, data in zip(ids, valid):
+            by_account.setdefault(data["account_id"], []).append((data["amount"], data["date"], transaction_id))
+        for target_account, items in by_account.items():
+            ledger.post_many(db, target_account, items)
+        rollup.add_rows(db, [(d["account_id"], d["category_id"], d["date"], d["amount"]) for d in valid])
+
+        db.commit()
+        imported += len(valid)
+
+    return {"imported": imported, "skipped": skipped, "errors": errors}
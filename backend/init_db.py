@@ -1,42 +1,42 @@
+import time
+from sqlalchemy import exists, insert, literal, select, union_all
 from database import SessionLocal, engine
-import models
+import models, migrations, versions
 
-# Crear las tablas por si no existen
-models.Base.metadata.create_all(bind=engine)
 
-def init_categories():
-    db = SessionLocal()
-    
-    # Lista de categorías básicas para arrancar
-    categories_list = [
-        {"name": "Sueldo", "type": "ingreso", "icon": "💰"},
-        {"name": "Freelance", "type": "ingreso", "icon": "💻"},
-        {"name": "Supermercado", "type": "gasto", "icon": "🛒"},
-        {"name": "Servicios", "type": "gasto", "icon": "💡"},
-        {"name": "Alquiler", "type": "gasto", "icon": "🏠"},
-        {"name": "Salidas", "type": "gasto", "icon": "🍺"},
-        {"name": "Transporte", "type": "gasto", "icon": "🚌"},
-        {"name": "Salud", "type": "gasto", "icon": "💊"},
-    ]
-
-    print("Cargando categorías...")
-    for cat_data in categories_list:
-        # Chequeamos si ya existe para no duplicar
-        exists = db.query(models.Category).filter_by(name=cat_data["name"]).first()
-        if not exists:
-            new_cat = models.Category(
-                name=cat_data["name"],
-                type=cat_data["type"],
-                icon=cat_data["icon"]
-            )
-            db.add(new_cat)
-            print(f"Creada: {cat_data['name']}")
-        else:
-            print(f"Ya existe: {cat_data['name']}")
+# --- BOOTSTRAP DE LA BASE (CORRER UNA VEZ POR DEPLOY) ---
+#   python init_db.py
+# Crea/actualiza tablas e índices (migrations.upgrade) y carga las
+# categorías globales. Así el server no hace nada de esto al arrancar.
+
+DEFAULT_CATEGORIES = ["Sueldo", "Alquiler", "Supermercado", "Servicios", "Ocio", "Transporte"]
 
+
+def seed_default_categories(db):
+    # Un solo INSERT ... SELECT que agrega solo las que faltan (se puede correr siempre)
+    names = union_all(*[select(literal(name).label("name")) for name in DEFAULT_CATEGORIES]).subquery()
+    missing = select(names.c.name).where(~exists().where(
+        models.Category.name == names.c.name,
+        models.Category.user_id == None,
+    ))
+    created = db.execute(insert(models.Category).from_select(["name"], missing)).rowcount
+    if created:
+        versions.bump(db, None)
     db.commit()
-    db.close()
-    print("¡Categorías listas!")
+    return created
+
+
+def bootstrap(bind=engine):
+    migrations.upgrade(bind)
+    db = SessionLocal()
+    try:
+        return seed_default_categories(db)
+    finally:
+        db.close()
+
 
 if __name__ == "__main__":
-    init_categories()
\ No newline at end of file
+    started = time.perf_counter()
+    created = bootstrap()
+    print(f"Categorías globales creadas: {created}")
+    print(f"¡Base lista! ({time.perf_counter() - started:.2f} s)")
@@ -0,0 +1,231 @@
+from datetime import date
+from typing import Optional
+from sqlalchemy import and_, exists, func, insert, or_, update
+from sqlalchemy.orm import Session
+import models, versions
+from models import to_money
+
+
+# --- LEDGER (LIBRO MAYOR) ---
+# Todos los cambios de saldo pasan por post(): el saldo se actualiza con un
+# UPDATE atómico (balance = balance + delta) y se agrega un asiento con el
+# saldo resultante. Los snapshots mensuales guardan el saldo al cierre de
+# cada mes, así "saldo al día X" no necesita recorrer toda la historia.
+# El balance_after guardado es el saldo en el momento de registrar el
+# asiento (orden de carga). Con un movimiento de fecha atrasada deja de
+# coincidir con el orden por fecha, así que el listado lo recalcula en
+# orden (date, id); balance_at ya suma por fecha.
+
+class InsufficientFunds(ValueError):
+    pass
+
+
+def _month(value: date) -> str:
+    return value.strftime("%Y-%m")
+
+
+def post(db: Session, account_id: int, amount, on: Optional[date] = None,
+         transaction_id: Optional[int] = None, require_funds: bool = False):
+    # No hace commit: el que llama decide cuándo cerrar la transacción
+    delta = to_money(amount)
+    on = on or date.today()
+
+    stmt = update(models.Account)\
+        .where(models.Account.id == account_id)\
+        .values(balance=models.Account.balance + delta)\
+        .returning(models.Account.balance)
+    if require_funds:
+        stmt = stmt.where(models.Account.balance + delta >= 0)
+
+    new_balance = db.execute(stmt).scalar_one_or_none()
+    if new_balance is None:
+        if require_funds and db.get(models.Account, account_id) is not None:
+            raise InsufficientFunds("Saldo insuficiente en la cuenta")
+        raise LookupError("Cuenta no encontrada")
+
+    entry = models.LedgerEntry(
+        account_id=account_id,
+        transaction_id=transaction_id,
+        amount=delta,
+        balance_after=to_money(new_balance),
+        date=on,
+    )
+    db.add(entry)
+
+    # Si el asiento es de un mes ya "cerrado", corremos los snapshots posteriores
+    db.query(models.BalanceSnapshot)\
+      .filter(models.BalanceSnapshot.account_id == account_id,
+              models.BalanceSnapshot.month >= _month(on))\
+      .update({models.BalanceSnapshot.balance: models.BalanceSnapshot.balance + delta},
+              synchronize_session=False)
+    return entry
+
+
+def post_many(db: Session, account_id: int, items):
+    # Versión por lote de post(): un solo UPDATE con el delta total de la cuenta
+    # y los asientos en un INSERT masivo. items = [(monto, fecha, transaction_id)]
+    items = [(to_money(amount), on, transaction_id) for amount, on, transaction_id in items]
+    if not items:
+        return 0
+    total = sum((amount for amount, _, _ in items), to_money(0))
+
+    row = db.execute(
+        update(models.Account)
+        .where(models.Account.id == account_id)
+        .values(balance=models.Account.balance + total)
+        .returning(models.Account.balance, models.Account.user_id)
+    ).first()
+    if row is None:
+        raise LookupError("Cuenta no encontrada")
+    new_balance, user_id = row
+    versions.bump(db, user_id)
+
+    running = to_money(new_balance) - total
+    entries = []
+    by_month = {}
+    for amount, on, transaction_id in items:
+        running += amount
+        entries.append({"account_id": account_id, "transaction_id": transaction_id,
+                        "amount": amount, "balance_after": running, "date": on})
+        by_month[_month(on)] = by_month.get(_month(on), to_money(0)) + amount
+    db.execute(insert(models.LedgerEntry), entries)
+
+    for month, delta in by_month.items():
+        db.query(models.BalanceSnapshot)\
+          .filter(models.BalanceSnapshot.account_id == account_id,
+                  models.BalanceSnapshot.month >= month)\
+          .update({models.BalanceSnapshot.balance: models.BalanceSnapshot.balance + delta},
+                  synchronize_session=False)
+    return len(entries)
+
+
+def _sum_between(db: Session, account_id: int, start: Optional[date], end: date):
+    # Suma de asientos con start <= fecha <= end (usa el índice account_id, date)
+    query = db.query(func.coalesce(func.sum(models.LedgerEntry.amount), 0))\
+              .filter(models.LedgerEntry.account_id == account_id,
+                      models.LedgerEntry.date <= end)
+    if start is not None:
+        query = query.filter(models.LedgerEntry.date >= start)
+    return to_money(query.scalar())
+
+
+def balance_at(db: Session, account_id: int, at: date):
+    # Último snapshot antes del mes pedido + los asientos desde ahí hasta "at"
+    snapshot = db.query(models.BalanceSnapshot)\
+                 .filter(models.BalanceSnapshot.account_id == account_id,
+                         models.BalanceSnapshot.month < _month(at))\
+                 .order_by(models.BalanceSnapshot.month.desc())\
+                 .first()
+    if snapshot is None:
+        return _sum_between(db, account_id, None, at)
+
+    year, month = map(int, snapshot.month.split("-"))
+    start = date(year + month // 12, month % 12 + 1, 1)
+    return to_money(snapshot.balance) + _sum_between(db, account_id, start, at)
+
+
+def get_entries(db: Session, account_id: int, limit: int = 100, before_id: Optional[int] = None):
+    # Más nuevos primero en orden (date, id); before_id es el último asiento de la página anterior
+    entry = models.LedgerEntry
+    query = db.query(entry).filter(entry.account_id == account_id)
+    if before_id is not None:
+        cursor = db.query(entry.date).filter(entry.id == before_id, entry.account_id == account_id).scalar()
+        if cursor is None:
+            return []
+        query = query.filter(or_(entry.date < cursor, and_(entry.date == cursor, entry.id < before_id)))
+    entries = query.order_by(entry.date.desc(), entry.id.desc()).limit(limit).all()
+    if not entries:
+        return []
+
+    # Saldo después del primero de la página = saldo actual - lo posterior (pocos asientos)
+    top = entries[0]
+    balance = db.query(models.Account.balance).filter(models.Account.id == account_id).scalar()
+    later = db.query(func.coalesce(func.sum(entry.amount), 0))\
+              .filter(entry.account_id == account_id,
+                      or_(entry.date > top.date, and_(entry.date == top.date, entry.id > top.id)))\
+              .scalar()
+    running = to_money(balance) - to_money(later)
+
+    rows = []
+    for e in entries:
+        rows.append({"id": e.id, "account_id": e.account_id, "transaction_id": e.transaction_id,
+                     "amount": float(e.amount), "balance_after": float(running), "date": e.date})
+        running -= to_money(e.amount)
+    return rows
+
+
+def take_monthly_snapshots(db: Session, month: str, account_ids=None):
+    # Guarda (o recalcula) el saldo de cierre de "YYYY-MM" (de todas las cuentas o de account_ids)
+    year, m = map(int, month.split("-"))
+    end = date(year + m // 12, m % 12 + 1, 1)
+    last_day = date.fromordinal(end.toordinal() - 1)
+
+    if account_ids is None:
+        account_ids = [row[0] for row in db.query(models.Account.id).all()]
+    for account_id in account_ids:
+        balance = balance_at(db, account_id, last_day)
+        snapshot = db.query(models.BalanceSnapshot)\
+                     .filter_by(account_id=account_id, month=month).first()
+        if snapshot:
+            snapshot.balance = balance
+        else:
+            db.add(models.BalanceSnapshot(account_id=account_id, month=month, balance=balance))
+    db.commit()
+    return len(account_ids)
+
+
+def ensure_monthly_snapshots(db: Session, today: Optional[date] = None):
+    # Snapshot del mes anterior para las cuentas que todavía no lo tienen (lo llama el job de recurring.py)
+    today = today or date.today()
+    month = _month(date.fromordinal(today.replace(day=1).toordinal() - 1))
+    missing = [row[0] for row in db.query(models.Account.id).filter(~exists().where(
+        models.BalanceSnapshot.account_id == models.Account.id,
+        models.BalanceSnapshot.month == month,
+    ))]
+    if not missing:
+        return 0
+    return take_monthly_snapshots(db, month, account_ids=missing)
+
+
+def rebuild(db: Session):
+    # Arma el ledger desde cero con las transacciones existentes. El saldo que
+    # no se explica por transacciones queda como asiento de apertura.
+    db.query(models.BalanceSnapshot).delete()
+    db.query(models.LedgerEntry).delete()
+
+    for account in db.query(models.Account).all():
+        transactions = db.query(models.Transaction)\
+                         .filter(models.Transaction.account_id == account.id)\
+                         .order_by(models.Transaction.date, models.Transaction.id)\
+                         .all()
+        explained = sum((to_money(t.amount) for t in transactions), to_money(0))
+        opening = to_money(account.balance) - explained
+        first_date = transactions[0].date if transactions and transactions[0].date else date.today()
+
+        running = to_money(0)
+        entries = [(opening, first_date, None)] if opening else []
+        entries += [(to_money(t.amount), t.date or first_date, t.id) for t in transactions]
+        for amount, on, transaction_id in entries:
+            running += amount
+            db.add(models.LedgerEntry(account_id=account.id, transaction_id=transaction_id,
+                                      amount=amount, balance_after=running, date=on))
+    db.commit()
+
+
+if __name__ == "__main__":
+    import sys
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        command = sys.argv[1] if len(sys.argv) > 1 else ""
+        if command == "rebuild":
+            rebuild(db)
+            print("¡Ledger reconstruido!")
+        elif command == "snapshot":
+            month = sys.argv[2] if len(sys.argv) > 2 else _month(date.today())
+            print(f"Snapshots {month}: {take_monthly_snapshots(db, month)} cuentas")
+        else:
+            print("Uso: python ledger.py rebuild | snapshot [YYYY-MM]")
+    finally:
+        db.close()
@@ -1,17 +1,30 @@
-from fastapi import FastAPI, Depends, HTTPException
+import time
+BOOT_STARTED = time.perf_counter()  # para medir cuánto tarda en arrancar el worker
+
+import asyncio
+import os
+from fastapi import FastAPI, Depends, HTTPException, Query, Response, UploadFile, File, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware 
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from typing import List
-import models, schemas, crud
+from typing import List, Optional
+import models, schemas, crud, migrations, ledger, database, passwords, statements, recurring, idempotency, versions, responses, metrics, rates, projections, rollup, budgets
 from database import engine, get_db
-from datetime import datetime
+from datetime import date
+from decimal import Decimal
 from fastapi.security import OAuth2PasswordRequestForm
 from auth import create_access_token, get_current_user
 
 
-models.Base.metadata.create_all(bind=engine)
+# Las tablas, índices y categorías globales se crean con "python init_db.py"
+# en el deploy. Si al arrancar falta alguna tabla (base nueva, entorno
+# local) se corre igual, salvo AUTO_MIGRATE=0.
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") == "1"
+boot_seconds = None
 
-app = FastAPI(title="Control Financiero Pro API")
+app = FastAPI(title="Control Financiero Pro API", default_response_class=responses.FastJSONResponse)
 
 # Esto permite que React (localhost:5173) hable con Python
 origins = [
@@ -19,56 +32,115 @@ origins = [
     "http://127.0.0.1:5173",
 ]
 
+# Reintentos seguros de los POST (va antes que CORS para quedar "adentro")
+app.add_middleware(idempotency.IdempotencyMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed", "ETag", "Server-Timing"],
 )
+
+# Compresión brotli/gzip de respuestas grandes (la última en agregarse es la de más afuera)
+app.add_middleware(responses.CompressionMiddleware)
+# Métricas por request (la más de afuera: mide todo lo demás)
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument(engine)
+if database.async_engine is not None:
+    metrics.instrument(database.async_engine.sync_engine)
 # ----------------------------------------
 
+# Con ASYNC_DB=1 las rutas async se registran primero y tapan a las sync
+if database.ASYNC_DB:
+    import async_routes
+    app.include_router(async_routes.router)
+
 # ... (Acá abajo siguen tus endpoints de siempre: users, accounts, etc.)
-# --- CARGA INICIAL DE CATEGORÍAS GLOBALES ---
+# --- ARRANQUE ---
 @app.on_event("startup")
 def startup_event():
-    # --- IMPORTS TARDÍOS (LA SOLUCIÓN ANTI-CUELGUE) ---
-    from database import SessionLocal
-    from sqlalchemy import or_
-    import models 
-    
-    db = SessionLocal()
-    defaults = ["Sueldo", "Alquiler", "Supermercado", "Servicios", "Ocio", "Transporte"]
-    
+    global boot_seconds
+    if AUTO_MIGRATE and migrations.needs_upgrade(engine):
+        # --- IMPORTS TARDÍOS: solo hacen falta si hay que crear la base ---
+        import init_db
+        init_db.bootstrap(engine)
+
+    # Las categorías globales quedan en memoria desde el arranque
+    db = database.SessionLocal()
     try:
-        for name in defaults:
-            # Buscamos si existe la global
-            exists = db.query(models.Category).filter(models.Category.name == name, models.Category.user_id == None).first()
-            if not exists:
-                db.add(models.Category(name=name, user_id=None))
-        db.commit()
-    except Exception as e:
-        print(f"Error en carga inicial: {e}")
+        crud.load_global_categories(db)
     finally:
         db.close()
+    boot_seconds = round(time.perf_counter() - BOOT_STARTED, 3)
+    print(f"Worker listo en {boot_seconds} s")
 
+# --- COBROS RECURRENTES (JOB EN SEGUNDO PLANO) ---
+scheduler_task = None
+
+@app.on_event("startup")
+async def start_recurring_scheduler():
+    global scheduler_task
+    if recurring.ENABLED:
+        scheduler_task = asyncio.create_task(recurring.run_scheduler(database.SessionLocal))
+
+# --- SALUD / MONITOREO ---
+@app.get("/health")
+def health():
+    return {"status": "ok", "boot_seconds": boot_seconds, "pool": database.pool_stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.post("/users/", response_model=schemas.UserResponse)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
-    if db_user:
-        raise HTTPException(status_code=400, detail="El email ya está registrado")
-    return crud.create_user(db=db, user=user)
+async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    return await _register(user, db)
 
 @app.post("/users/{user_id}/accounts/", response_model=schemas.AccountResponse)
 def create_account_for_user(user_id: int, account: schemas.AccountCreate, db: Session = Depends(get_db)):
     return crud.create_account(db=db, account=account, user_id=user_id)
 
-@app.post("/users/{user_id}/transactions/", response_model=schemas.TransactionResponse)
+@app.post("/users/{user_id}/transactions/", response_model=schemas.TransactionCreated)
 def create_transaction(user_id: int, transaction: schemas.TransactionCreate, db: Session = Depends(get_db)):
-    return crud.create_transaction(db=db, transaction=transaction, user_id=user_id)
+    try:
+        return crud.create_transaction(db=db, transaction=transaction, user_id=user_id)
+    except LookupError:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Cuenta no encontrada")
+
+# --- IMPORTACIÓN MASIVA (EXTRACTOS DEL BANCO) ---
+@app.post("/users/{user_id}/transactions/import", response_model=schemas.ImportResult)
+def import_transactions(
+    user_id: int,
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ofx)$"),
+    account_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    # Si no mandan el formato, lo sacamos de la extensión del archivo
+    import importers  # tardío: no se carga en el arranque
+    fmt = format or ("ofx" if (file.filename or "").lower().endswith((".ofx", ".qfx")) else "csv")
+    rows = importers.parse(file.file, fmt)
+    return importers.import_transactions(db, user_id, rows, account_id=account_id, category_id=category_id)
+
+# --- EXPORTACIÓN DEL HISTORIAL COMPLETO (STREAMING) ---
+@app.get("/users/{user_id}/transactions/export")
+def export_transactions(user_id: int, format: str = Query("csv", pattern="^(csv|ndjson)$")):
+    import exporters  # tardío: no se carga en el arranque
+    generator, media_type = exporters.FORMATS[format]
+    filename = f"transacciones_{user_id}.{format}"
+    return StreamingResponse(
+        generator(user_id),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
-@app.get("/users/{user_id}/accounts/", response_model=List[schemas.AccountResponse])
+@app.get("/users/{user_id}/accounts/", response_model=List[schemas.AccountResponse],
+         dependencies=[Depends(versions.check_etag)])
 def read_accounts(user_id: int, db: Session = Depends(get_db)):
     accounts = db.query(models.Account).filter(models.Account.user_id == user_id).all()
     return accounts
@@ -78,47 +150,140 @@ def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_
     return crud.create_category(db=db, category=category)
 
 
-@app.get("/users/{user_id}/transactions/", response_model=List[schemas.TransactionResponse])
-def read_transactions(user_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    transactions = crud.get_transactions_by_user(db, user_id=user_id, skip=skip, limit=limit)
+@app.get("/users/{user_id}/transactions/", response_model=List[schemas.TransactionResponse],
+         dependencies=[Depends(versions.check_etag)])
+def read_transactions(
+    user_id: int,
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    account_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    # Paginación por cursor: el cliente manda el X-Next-Cursor de la página anterior
+    try:
+        transactions = crud.get_transactions_by_user(
+            db, user_id=user_id, skip=skip, limit=limit, cursor=cursor,
+            date_from=date_from, date_to=date_to,
+            account_id=account_id, category_id=category_id,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if len(transactions) == limit:
+        last = transactions[-1]
+        response.headers["X-Next-Cursor"] = crud.encode_cursor(last.date, last.id)
     return transactions
 
-@app.get("/users/{user_id}/subscriptions/", response_model=List[schemas.SubscriptionResponse])
+# Variante liviana: cada fila trae solo account_id y las cuentas van una vez.
+# Se arma directo desde las columnas y se serializa con orjson, sin pasar por
+# un modelo de Pydantic por fila.
+@app.get("/users/{user_id}/transactions/slim", response_model=schemas.TransactionPage,
+         dependencies=[Depends(versions.check_etag)])
+def read_transactions_slim(
+    user_id: int,
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    account_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        rows, accounts = crud.get_transactions_slim(
+            db, user_id=user_id, skip=skip, limit=limit, cursor=cursor,
+            date_from=date_from, date_to=date_to,
+            account_id=account_id, category_id=category_id,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = crud.encode_cursor(rows[-1].date, rows[-1].id)
+
+    content = {
+        "accounts": [schemas.AccountResponse.model_validate(a).model_dump() for a in accounts],
+        "transactions": [
+            {"id": t_id, "amount": float(amount), "description": description,
+             "date": t_date.isoformat() if t_date else None, "category_id": t_category, "account_id": t_account}
+            for t_id, amount, description, t_date, t_category, t_account in rows
+        ],
+    }
+    return responses.FastJSONResponse(content, headers=dict(response.headers))
+
+# --- ANALYTICS: FLUJO DE CAJA MENSUAL (AGREGADO EN SQL) ---
+@app.get("/users/{user_id}/analytics/cashflow", response_model=List[schemas.CashflowMonth])
+def read_cashflow(user_id: int, months: int = Query(6, ge=1, le=120), db: Session = Depends(get_db)):
+    return crud.get_monthly_cashflow(db, user_id=user_id, months=months)
+
+# --- COTIZACIONES Y TOTALES EN UNA MONEDA BASE ---
+@app.post("/exchange-rates/", response_model=schemas.ExchangeRateResponse)
+def create_exchange_rate(payload: schemas.ExchangeRateCreate, db: Session = Depends(get_db)):
+    row = rates.set_rate(db, payload.currency, payload.rate, payload.date)
+    db.commit()
+    db.refresh(row)
+    return row
+
+@app.get("/exchange-rates/", response_model=List[schemas.ExchangeRateResponse])
+def read_exchange_rates(currency: str = Query(..., pattern=r"^[A-Z]{3}$"), limit: int = Query(90, ge=1, le=1000),
+                        db: Session = Depends(get_db)):
+    return db.query(models.ExchangeRate)\
+             .filter(models.ExchangeRate.currency == currency)\
+             .order_by(models.ExchangeRate.date.desc())\
+             .limit(limit)\
+             .all()
+
+@app.get("/users/{user_id}/analytics/net-worth", response_model=schemas.NetWorth)
+def read_net_worth(user_id: int, base: str = Query(rates.REFERENCE_CURRENCY, pattern=r"^[A-Z]{3}$"),
+                   db: Session = Depends(get_db)):
+    return rates.net_worth(db, user_id=user_id, base=base)
+
+@app.get("/users/{user_id}/analytics/converted-cashflow", response_model=List[schemas.ConvertedCashflowMonth])
+def read_converted_cashflow(user_id: int, base: str = Query(rates.REFERENCE_CURRENCY, pattern=r"^[A-Z]{3}$"),
+                            months: int = Query(6, ge=1, le=120), db: Session = Depends(get_db)):
+    return rates.converted_cashflow(db, user_id=user_id, base=base, months=months)
+
+# --- ANALYTICS: TOTALES POR CATEGORÍA Y MES (RESUMEN DE rollup.py) ---
+@app.get("/users/{user_id}/analytics/categories", response_model=List[schemas.CategoryMonthTotal])
+def read_category_totals(user_id: int, month: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+                         months: int = Query(1, ge=1, le=120), db: Session = Depends(get_db)):
+    last = month or date.today().strftime("%Y-%m")
+    first = crud._months_back(months, crud._month_range(last)[1]).strftime("%Y-%m")
+    return rollup.totals(db, user_id=user_id, first_month=first, last_month=last)
+
+# --- DASHBOARD: TODO LO DE LA PANTALLA PRINCIPAL EN UNA SOLA LLAMADA ---
+@app.get("/users/{user_id}/dashboard", response_model=schemas.DashboardSummary)
+def read_dashboard(user_id: int, month: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+                   db: Session = Depends(get_db)):
+    return crud.get_dashboard_summary(db, user_id=user_id, month=month)
+
+@app.get("/users/{user_id}/subscriptions/", response_model=List[schemas.SubscriptionResponse],
+         dependencies=[Depends(versions.check_etag)])
 def read_subscriptions(user_id: int, db: Session = Depends(get_db)):
     return crud.get_subscriptions(db, user_id=user_id)
 
 @app.post("/users/{user_id}/subscriptions/", response_model=schemas.SubscriptionResponse)
 def create_subscription(user_id: int, subscription: schemas.SubscriptionCreate, db: Session = Depends(get_db)):
-    # 1. Crear la Suscripción en su tabla
-    db_subscription = crud.create_subscription(db=db, subscription=subscription, user_id=user_id)
-    
-    # 2. MAGIA: Si eligió una tarjeta, creamos el gasto recurrente automáticamente
-    if subscription.card_id:
-        # Creamos el objeto de compra
-        new_purchase = models.CardPurchase(
-            description=f"Suscripción: {subscription.name}",
-            amount=subscription.price,
-            currency=subscription.currency,
-            installments=1, # Las suscripciones son siempre 1 pago (recurrente)
-            date=datetime.now().strftime("%Y-%m-%d"), # Fecha de hoy
-            is_recurring=True, # <--- ESTO ES CLAVE
-            card_id=subscription.card_id
-        )
-        db.add(new_purchase)
-        db.commit()
-
-    return db_subscription
+    return crud.create_subscription(db=db, subscription=subscription, user_id=user_id)
 
 # --- RUTAS TARJETAS ---
 @app.post("/users/{user_id}/credit-cards/", response_model=schemas.CreditCardResponse)
 def create_credit_card(user_id: int, card: schemas.CreditCardCreate, db: Session = Depends(get_db)):
     return crud.create_credit_card(db=db, card=card, user_id=user_id)
 
-@app.get("/users/{user_id}/credit-cards/", response_model=List[schemas.CreditCardResponse])
+@app.get("/users/{user_id}/credit-cards/", response_model=List[schemas.CreditCardResponse],
+         dependencies=[Depends(versions.check_etag)])
 def read_credit_cards(user_id: int, db: Session = Depends(get_db)):
     return crud.get_credit_cards(db, user_id=user_id)
 
-@app.post("/credit-cards/{card_id}/purchases/", response_model=schemas.CardPurchaseResponse)
+@app.post("/credit-cards/{card_id}/purchases/", response_model=schemas.CardPurchaseCreated)
 def create_card_purchase(card_id: int, purchase: schemas.CardPurchaseCreate, db: Session = Depends(get_db)):
     return crud.create_card_purchase(db=db, purchase=purchase, card_id=card_id)
 
@@ -126,6 +291,15 @@ def create_card_purchase(card_id: int, purchase: schemas.CardPurchaseCreate, db:
 def read_card_purchases(card_id: int, db: Session = Depends(get_db)):
     return crud.get_card_purchases(db, card_id=card_id)
 
+# --- RESUMEN DEL MES (CUOTAS + DÉBITOS AUTOMÁTICOS) ---
+@app.get("/credit-cards/{card_id}/statement", response_model=schemas.CardStatement)
+def read_card_statement(card_id: int, period: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+                        db: Session = Depends(get_db)):
+    card = db.get(models.CreditCard, card_id)
+    if not card:
+        raise HTTPException(status_code=404, detail="Tarjeta no encontrada")
+    return statements.get_statement(db, card, period or date.today().strftime("%Y-%m"))
+
 @app.delete("/card-purchases/{purchase_id}")
 def delete_purchase(purchase_id: int, db: Session = Depends(get_db)):
     success = crud.delete_card_purchase(db, purchase_id)
@@ -133,25 +307,31 @@ def delete_purchase(purchase_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Gasto no encontrado")
     return {"message": "Eliminado correctamente"}
 
-@app.get("/users/{user_id}/categories/", response_model=List[schemas.CategoryResponse])
+@app.get("/users/{user_id}/categories/", response_model=List[schemas.CategoryResponse],
+         dependencies=[Depends(versions.check_etag)])
 def read_categories(user_id: int, db: Session = Depends(get_db)):
-    from sqlalchemy import or_ # <--- IMPORTAR ACÁ TAMBIÉN
-    
-    return db.query(models.Category).filter(
-        or_(
-            models.Category.user_id == user_id,
-            models.Category.user_id == None
-        )
-    ).all()
+    # Globales + propias, desde memoria (ver crud.get_user_categories)
+    return crud.get_user_categories(db, user_id=user_id)
 
 # --- RUTAS CLIENTES ---
 @app.post("/users/{user_id}/clients/", response_model=schemas.ClientResponse)
 def create_client(user_id: int, client: schemas.ClientCreate, db: Session = Depends(get_db)):
     return crud.create_client(db=db, client=client, user_id=user_id)
 
-@app.get("/users/{user_id}/clients/", response_model=List[schemas.ClientResponse])
-def read_clients(user_id: int, db: Session = Depends(get_db)):
-    return crud.get_clients(db, user_id=user_id)
+# ?include=jobs trae los trabajos de todos los clientes en la misma respuesta
+# (exclude_unset: sin include, la respuesta queda igual que antes, sin "jobs")
+@app.get("/users/{user_id}/clients/", response_model=List[schemas.ClientWithJobs], response_model_exclude_unset=True,
+         dependencies=[Depends(versions.check_etag)])
+def read_clients(user_id: int, include: Optional[str] = None, db: Session = Depends(get_db)):
+    include_jobs = include == "jobs"
+    clients = crud.get_clients(db, user_id=user_id, include_jobs=include_jobs)
+    if include_jobs:
+        return [schemas.ClientWithJobs.model_validate(c) for c in clients]
+    return [schemas.ClientResponse.model_validate(c) for c in clients]
+
+@app.get("/users/{user_id}/analytics/top-clients", response_model=List[schemas.ClientTotal])
+def read_top_clients(user_id: int, limit: int = Query(5, ge=1, le=100), db: Session = Depends(get_db)):
+    return crud.get_top_clients(db, user_id=user_id, limit=limit)
 
 # --- RUTAS TRABAJOS ---
 @app.post("/clients/{client_id}/jobs/", response_model=schemas.JobResponse)
@@ -167,12 +347,18 @@ def read_client_jobs(client_id: int, db: Session = Depends(get_db)):
 def pay_job(job_id: int, payment_data: schemas.JobPay, db: Session = Depends(get_db)):
     job = db.query(models.Job).filter(models.Job.id == job_id).first()
     if not job: raise HTTPException(status_code=404, detail="Trabajo no encontrado")
-    if job.is_paid: raise HTTPException(status_code=400, detail="Ya cobrado")
 
-    job.is_paid = True
+    # Marcamos como cobrado en un UPDATE condicional: si dos pedidos llegan
+    # juntos, solo uno encuentra is_paid en falso
+    marked = db.execute(
+        update(models.Job)
+        .where(models.Job.id == job_id, models.Job.is_paid == False)
+        .values(is_paid=True)
+    ).rowcount
+    if not marked: raise HTTPException(status_code=400, detail="Ya cobrado")
     
     # --- CÁLCULO ---
-    final_amount = job.amount * payment_data.exchange_rate
+    final_amount = crud.to_money(job.amount * Decimal(str(payment_data.exchange_rate)))
     
     # --- DESCRIPCIÓN ---
     desc = f"Cobro: {job.description}"
@@ -180,7 +366,7 @@ def pay_job(job_id: int, payment_data: schemas.JobPay, db: Session = Depends(get
         desc += f" (U$S {job.amount} x {payment_data.exchange_rate})"
 
     # --- FECHA DE HOY (CORRECCIÓN) ---
-    today = datetime.now().strftime("%Y-%m-%d")
+    today = date.today()
 
     transaction = models.Transaction(
         amount=abs(final_amount),
@@ -189,14 +375,37 @@ def pay_job(job_id: int, payment_data: schemas.JobPay, db: Session = Depends(get
         account_id=payment_data.account_id,
         category_id=1 
     )
-    
-    account = db.query(models.Account).filter(models.Account.id == payment_data.account_id).first()
-    if account: account.balance += abs(final_amount)
-
     db.add(transaction)
+    db.flush()
+
+    try:
+        ledger.post(db, payment_data.account_id, transaction.amount, on=today, transaction_id=transaction.id)
+    except LookupError:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Cuenta no encontrada")
+
+    # Guardamos la cotización usada (ej. USD -> ARS) para las conversiones, solo si
+    # la mandaron: el 1.0 por defecto no es una cotización real
+    account = db.get(models.Account, payment_data.account_id)
+    if job.currency != account.currency and "exchange_rate" in payment_data.model_fields_set:
+        rates.record_pair(db, job.currency, account.currency, payment_data.exchange_rate, today)
+
     db.commit()
     return {"message": "Cobro registrado"}
 
+# --- LEDGER: SALDO A UNA FECHA E HISTORIAL DE LA CUENTA ---
+@app.get("/accounts/{account_id}/balance", response_model=schemas.AccountBalanceAt)
+def read_balance_at(account_id: int, at: Optional[date] = None, db: Session = Depends(get_db)):
+    if not db.get(models.Account, account_id):
+        raise HTTPException(status_code=404, detail="Cuenta no encontrada")
+    at = at or date.today()
+    return {"account_id": account_id, "date": at, "balance": ledger.balance_at(db, account_id, at)}
+
+@app.get("/accounts/{account_id}/ledger", response_model=List[schemas.LedgerEntryResponse])
+def read_ledger(account_id: int, limit: int = Query(100, ge=1, le=1000), before_id: Optional[int] = None,
+                db: Session = Depends(get_db)):
+    return ledger.get_entries(db, account_id, limit=limit, before_id=before_id)
+
 # BORRAR CUENTA
 @app.delete("/accounts/{account_id}")
 def delete_account(account_id: int, db: Session = Depends(get_db)):
@@ -206,6 +415,9 @@ def delete_account(account_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Cuenta no encontrada")
     
     # Opcional: Borrar transacciones asociadas primero para evitar errores (Cascade manual)
+    db.query(models.LedgerEntry).filter(models.LedgerEntry.account_id == account_id).delete()
+    db.query(models.BalanceSnapshot).filter(models.BalanceSnapshot.account_id == account_id).delete()
+    rollup.remove_account(db, account_id)
     db.query(models.Transaction).filter(models.Transaction.account_id == account_id).delete()
     
     db.delete(account)
@@ -223,10 +435,35 @@ def delete_category(category_id: int, db: Session = Depends(get_db)):
     if category.user_id is None:
         raise HTTPException(status_code=403, detail="No podés borrar categorías del sistema")
 
+    db.query(models.Budget).filter(models.Budget.category_id == category_id).delete()
     db.delete(category)
     db.commit()
+    crud.invalidate_categories(category.user_id)
     return {"message": "Categoría eliminada"}
 
+# --- PRESUPUESTOS ---
+@app.post("/users/{user_id}/budgets/", response_model=schemas.BudgetResponse)
+def set_budget(user_id: int, budget: schemas.BudgetCreate, db: Session = Depends(get_db)):
+    try:
+        return budgets.set_budget(db, user_id=user_id, category_id=budget.category_id,
+                                  currency=budget.currency, limit=budget.limit)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Categoría no encontrada")
+
+@app.get("/users/{user_id}/budgets/", response_model=List[schemas.BudgetStatus])
+def read_budgets(user_id: int, month: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+                 db: Session = Depends(get_db)):
+    return budgets.list_status(db, user_id=user_id, month=month)
+
+@app.delete("/budgets/{budget_id}")
+def delete_budget(budget_id: int, db: Session = Depends(get_db)):
+    budget = db.get(models.Budget, budget_id)
+    if not budget:
+        raise HTTPException(status_code=404, detail="Presupuesto no encontrado")
+    db.delete(budget)
+    db.commit()
+    return {"message": "Presupuesto eliminado"}
+
 @app.post("/users/{user_id}/goals/", response_model=schemas.GoalResponse)
 def create_goal(user_id: int, goal: schemas.GoalCreate, db: Session = Depends(get_db)):
     db_goal = models.Goal(**goal.dict(), user_id=user_id)
@@ -235,14 +472,22 @@ def create_goal(user_id: int, goal: schemas.GoalCreate, db: Session = Depends(ge
     db.refresh(db_goal)
     return db_goal
 
-@app.get("/users/{user_id}/goals/", response_model=List[schemas.GoalResponse])
+@app.get("/users/{user_id}/goals/", response_model=List[schemas.GoalResponse],
+         dependencies=[Depends(versions.check_etag)])
 def read_goals(user_id: int, db: Session = Depends(get_db)):
     return db.query(models.Goal).filter(models.Goal.user_id == user_id).all()
 
+@app.get("/users/{user_id}/goals/projections", response_model=List[schemas.GoalProjection])
+def read_goal_projections(user_id: int, months: int = Query(projections.HISTORY_MONTHS, ge=1, le=36),
+                          db: Session = Depends(get_db)):
+    return projections.project_goals(db, user_id=user_id, months=months)
+
 @app.delete("/goals/{goal_id}")
 def delete_goal(goal_id: int, db: Session = Depends(get_db)):
-    db.query(models.Goal).filter(models.Goal.id == goal_id).delete()
-    db.commit()
+    goal = db.get(models.Goal, goal_id)
+    if goal:
+        db.delete(goal)
+        db.commit()
     return {"message": "Meta eliminada"}
 
 # --- MAGIA: MOVER PLATA A LA META ---
@@ -259,57 +504,95 @@ def deposit_to_goal(goal_id: int, deposit: schemas.GoalDeposit, db: Session = De
     if goal.currency != account.currency:
         raise HTTPException(status_code=400, detail=f"No podés mezclar monedas. La meta es {goal.currency} y la cuenta es {account.currency}")
 
-    # 3. Validar Saldo
-    if account.balance < deposit.amount:
-        raise HTTPException(status_code=400, detail="Saldo insuficiente en la cuenta")
-
-    # 4. Mover la plata
-    account.balance -= deposit.amount
-    goal.current_amount += deposit.amount
-
-    # 5. Registrar Transacción de salida (Para que quede en el historial)
+    # 3. Registrar Transacción de salida (Para que quede en el historial)
+    amount = crud.to_money(deposit.amount)
     transaction = models.Transaction(
-        amount=-deposit.amount,
+        amount=-amount,
         description=f"Ahorro para meta: {goal.name}",
-        date=datetime.now().strftime("%Y-%m-%d"),
+        date=date.today(),
         account_id=account.id,
         category_id=1 # O idealmente una categoría "Ahorro"
     )
-    
     db.add(transaction)
+    db.flush()
+
+    # 4. Mover la plata (el ledger valida el saldo en el mismo UPDATE)
+    try:
+        ledger.post(db, account.id, -amount, on=transaction.date,
+                    transaction_id=transaction.id, require_funds=True)
+    except ledger.InsufficientFunds:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Saldo insuficiente en la cuenta")
+
+    new_amount = db.execute(
+        update(models.Goal)
+        .where(models.Goal.id == goal.id)
+        .values(current_amount=models.Goal.current_amount + amount)
+        .returning(models.Goal.current_amount)
+    ).scalar_one()
     db.commit()
     
-    return {"message": "¡Ahorro registrado!", "new_balance": goal.current_amount}
+    return {"message": "¡Ahorro registrado!", "new_balance": new_amount}
 
 # --- REGISTRO DE USUARIO ---
-@app.post("/register", response_model=schemas.UserResponse)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+# /register y /token son "async def": bcrypt corre en el pool de procesos de
+# passwords.py y las consultas cortas en el threadpool, así un login no
+# ocupa un thread durante todo el hash.
+async def _register(user: schemas.UserCreate, db: Session):
+    db_user = await run_in_threadpool(crud.get_user_by_email, db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="El email ya está registrado")
-    return crud.create_user(db=db, user=user)
+    hashed_password = await passwords.hash_password_async(user.password)
+    return await run_in_threadpool(crud.create_user, db, user, hashed_password)
+
+@app.post("/register", response_model=schemas.UserResponse)
+async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    return await _register(user, db)
 
 # --- LOGIN (OBTENER TOKEN) ---
 @app.post("/token")
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    # 1. Buscar usuario
-    user = crud.get_user_by_email(db, email=form_data.username) # OAuth2 usa 'username' para el email
-    
-    # 2. Verificar contraseña (usamos la función de auth.py, importala si hace falta o usala desde auth)
-    # Nota: Para hacerlo simple, validamos acá directo con auth
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     import auth
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+    email = form_data.username # OAuth2 usa 'username' para el email
+
+    # 1. Cuenta bloqueada por demasiados intentos fallidos
+    retry_after = auth.login_retry_after(email)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados intentos fallidos. Probá de nuevo más tarde",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    # 2. Buscar usuario y verificar contraseña (fuera del event loop)
+    user = await run_in_threadpool(crud.get_user_by_email, db, email=email)
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await passwords.verify_and_update_async(form_data.password, user.hashed_password)
+    if not valid:
+        auth.register_failed_login(email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email o contraseña incorrectos",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    # 3. Generar token
+    auth.reset_login_attempts(email)
+
+    # 3. Si cambió BCRYPT_ROUNDS, guardamos el hash con el costo nuevo
+    if new_hash:
+        await run_in_threadpool(crud.update_password_hash, db, user, new_hash)
+
+    # 4. Generar token
     access_token = auth.create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
+@app.on_event("shutdown")
+def shutdown_event():
+    passwords.shutdown()
+    if scheduler_task is not None:
+        scheduler_task.cancel()
+
 # --- EJEMPLO DE RUTA PROTEGIDA (INFO DEL USUARIO) ---
 @app.get("/users/me/", response_model=schemas.UserResponse)
-def read_users_me(current_user: models.User = Depends(get_current_user)):
+def read_users_me(current_user: schemas.UserResponse = Depends(get_current_user)):
     return current_user
\ No newline at end of file
@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+
+
+# --- MÉTRICAS POR REQUEST (PROMETHEUS) ---
+# El middleware mide cada request y los hooks de SQLAlchemy cuentan las
+# consultas y el tiempo en la base del request en curso (vía ContextVar,
+# que también viaja al threadpool de las rutas "def"). Todo se agrupa por
+# la ruta "plantilla" (/users/{user_id}/accounts/), no por la URL, para que
+# la cantidad de series no crezca con los ids.
+# Si un request pasa QUERY_BUDGET consultas se cuenta y se loguea: casi
+# siempre es un N+1 (lazy loads dentro de un loop).
+# /metrics devuelve todo en formato de texto de Prometheus.
+
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", 20))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+EXCLUDED_PATHS = {"/metrics"}
+
+_current = ContextVar("request_stats", default=None)
+_lock = threading.Lock()
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+# (method, route) -> métricas; (method, route, status) -> cantidad
+_latency = {}
+_queries = {}
+_db_seconds = {}
+_requests = {}
+_over_budget = {}
+
+
+def record(method: str, route: str, status: int, seconds: float, stats: RequestStats):
+    key = (method, route)
+    with _lock:
+        _latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+        _queries.setdefault(key, Histogram(QUERY_BUCKETS)).observe(stats.queries)
+        _db_seconds[key] = _db_seconds.get(key, 0.0) + stats.db_seconds
+        _requests[(method, route, status)] = _requests.get((method, route, status), 0) + 1
+        if stats.queries > QUERY_BUDGET:
+            _over_budget[key] = _over_budget.get(key, 0) + 1
+    if stats.queries > QUERY_BUDGET:
+        print(f"[metrics] {method} {route}: {stats.queries} consultas (presupuesto {QUERY_BUDGET})")
+
+
+def reset():
+    with _lock:
+        for store in (_latency, _queries, _db_seconds, _requests, _over_budget):
+            store.clear()
+
+
+# --- HOOKS DE SQLALCHEMY ---
+# El inicio se guarda en el contexto de ejecución de cada statement (no en una
+# pila por conexión): si un statement falla, after_cursor_execute no corre y
+# su inicio se descarta con el contexto, sin descalzar a los siguientes.
+_STARTED = "_metrics_started"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        setattr(context, _STARTED, time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, _STARTED, None)
+    stats = _current.get()
+    if stats is not None and started is not None:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def instrument(engine):
+    # Para el engine async se instrumenta su sync_engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# --- MIDDLEWARE ---
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Server-Timing: se ve en la pestaña Network del navegador
+                elapsed = (time.perf_counter() - started) * 1000
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(
+                    b"server-timing",
+                    f"db;dur={stats.db_seconds * 1000:.1f};desc=\"{stats.queries} queries\", app;dur={elapsed:.1f}".encode(),
+                )]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            record(scope["method"], route_path, status, time.perf_counter() - started, stats)
+
+
+# --- EXPOSICIÓN EN FORMATO PROMETHEUS ---
+def _labels(**labels):
+    inner = ",".join(f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for name, value in labels.items())
+    return "{" + inner + "}"
+
+
+def _histogram_lines(name, store):
+    lines = []
+    for (method, route), histogram in sorted(store.items()):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f"{name}_bucket{_labels(method=method, route=route, le=bound)} {count}")
+        lines.append(f"{name}_bucket{_labels(method=method, route=route, le='+Inf')} {histogram.total}")
+        lines.append(f"{name}_sum{_labels(method=method, route=route)} {histogram.sum}")
+        lines.append(f"{name}_count{_labels(method=method, route=route)} {histogram.total}")
+    return lines
+
+
+def render() -> str:
+    with _lock:
+        lines = [
+            "# HELP http_request_duration_seconds Latencia de los requests por ruta",
+            "# TYPE http_request_duration_seconds histogram",
+            *_histogram_lines("http_request_duration_seconds", _latency),
+            "# HELP http_requests_total Requests por ruta y status",
+            "# TYPE http_requests_total counter",
+            *[f"http_requests_total{_labels(method=m, route=r, status=s)} {n}"
+              for (m, r, s), n in sorted(_requests.items())],
+            "# HELP db_queries_per_request Consultas SQL por request",
+            "# TYPE db_queries_per_request histogram",
+            *_histogram_lines("db_queries_per_request", _queries),
+            "# HELP db_time_seconds_total Tiempo total en la base por ruta",
+            "# TYPE db_time_seconds_total counter",
+            *[f"db_time_seconds_total{_labels(method=m, route=r)} {s}"
+              for (m, r), s in sorted(_db_seconds.items())],
+            "# HELP requests_over_query_budget_total Requests que pasaron QUERY_BUDGET consultas",
+            "# TYPE requests_over_query_budget_total counter",
+            *[f"requests_over_query_budget_total{_labels(method=m, route=r)} {n}"
+              for (m, r), n in sorted(_over_budget.items())],
+        ]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,181 @@
+from sqlalchemy import inspect, text
+from database import engine, SessionLocal
+import models
+
+
+# --- MIGRACIONES LIVIANAS ---
+# create_all() solo crea tablas que no existen: si la tabla ya estaba,
+# los índices nuevos de models.py no se agregan. Esto los crea a mano.
+def ensure_indexes(bind=engine):
+    inspector = inspect(bind)
+    created = []
+    for table in models.Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=bind)
+                created.append(index.name)
+    return created
+
+
+# Lo mismo con las columnas nuevas de tablas que ya existen
+def ensure_columns(bind=engine):
+    inspector = inspect(bind)
+    added = []
+    for table in models.Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column.type.compile(dialect=bind.dialect)}'
+            if column.default is not None and column.default.is_scalar:
+                ddl += f" NOT NULL DEFAULT {column.default.arg!r}"
+            with bind.begin() as conn:
+                conn.execute(text(ddl))
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+# --- FECHAS Y MONTOS NATIVOS ---
+# Bases creadas antes de pasar a Date/Numeric tienen fechas como texto
+# ("2024-05-01" o "2024-05-01 00:00:00") y montos como FLOAT.
+DATE_COLUMNS = [
+    ("transactions", "date"),
+    ("card_purchases", "date"),
+    ("jobs", "date"),
+    ("goals", "deadline"),
+]
+
+MONEY_COLUMNS = [
+    ("accounts", "balance"),
+    ("transactions", "amount"),
+    ("subscriptions", "price"),
+    ("credit_cards", "limit"),
+    ("card_purchases", "amount"),
+    ("jobs", "amount"),
+    ("goals", "target_amount"),
+    ("goals", "current_amount"),
+]
+
+def migrate_native_types(bind=engine):
+    inspector = inspect(bind)
+    quote = bind.dialect.identifier_preparer.quote
+    changed = []
+
+    with bind.begin() as conn:
+        for table, column in DATE_COLUMNS + MONEY_COLUMNS:
+            if not inspector.has_table(table):
+                continue
+            current = {c["name"]: c["type"] for c in inspector.get_columns(table)}[column]
+            t, c = quote(table), quote(column)
+            is_date = (table, column) in DATE_COLUMNS
+
+            if bind.dialect.name == "postgresql":
+                # Postgres sí cambia el tipo de la columna (y reescribe los datos)
+                target = "DATE" if is_date else "NUMERIC(14, 2)"
+                if str(current).startswith(target.split("(")[0]):
+                    continue
+                if is_date:
+                    using = f"NULLIF(substr({c}::text, 1, 10), '')::date"
+                else:
+                    using = f"round({c}::numeric, 2)"
+                conn.execute(text(f"ALTER TABLE {t} ALTER COLUMN {c} TYPE {target} USING {using}"))
+            else:
+                # SQLite no tiene ALTER COLUMN y el tipo declarado es solo afinidad:
+                # alcanza con normalizar los valores guardados. Solo se tocan las filas
+                # que todavía no están normalizadas, así volver a correrlo no escribe nada.
+                if is_date:
+                    updated = conn.execute(text(f"UPDATE {t} SET {c} = NULL WHERE {c} = ''")).rowcount
+                    updated += conn.execute(text(f"UPDATE {t} SET {c} = substr({c}, 1, 10) WHERE length({c}) > 10")).rowcount
+                else:
+                    # (el ruido de punto flotante de las sumas en SQL no cuenta: al leer se redondea igual)
+                    updated = conn.execute(text(f"UPDATE {t} SET {c} = round({c}, 2) "
+                                                f"WHERE abs({c} - round({c}, 2)) > 0.000001")).rowcount
+                if not updated:
+                    continue
+            changed.append(f"{table}.{column}")
+    return changed
+
+
+def backfill_ledger():
+    # ledger_entries es nueva: la armamos una vez con los saldos y transacciones existentes
+    import ledger
+    db = SessionLocal()
+    try:
+        if db.query(models.LedgerEntry.id).first() or not db.query(models.Account.id).first():
+            return False
+        ledger.rebuild(db)
+        return True
+    finally:
+        db.close()
+
+
+def backfill_card_installments():
+    # card_installments es nueva: la llenamos una vez con las compras existentes
+    import statements
+    db = SessionLocal()
+    try:
+        if db.query(models.CardInstallment.id).first() or not db.query(models.CardPurchase.id).first():
+            return False
+        statements.rebuild(db)
+        return True
+    finally:
+        db.close()
+
+
+def backfill_category_totals():
+    # monthly_category_totals es nueva: la calculamos una vez desde transactions
+    import rollup
+    db = SessionLocal()
+    try:
+        if db.query(models.MonthlyCategoryTotal.user_id).first() or not db.query(models.Transaction.id).first():
+            return False
+        rollup.rebuild(db)
+        return True
+    finally:
+        db.close()
+
+
+# --- ACTUALIZAR UNA BASE EXISTENTE (O CREARLA) ---
+def needs_upgrade(bind=engine):
+    # Un solo query: ¿falta alguna tabla de models.py?
+    existing = set(inspect(bind).get_table_names())
+    return any(table.name not in existing for table in models.Base.metadata.sorted_tables)
+
+
+def backfill_legacy_subscriptions():
+    # Compras is_recurring del esquema viejo de suscripciones: se convierten una sola vez
+    import recurring
+    db = SessionLocal()
+    try:
+        return recurring.convert_legacy_templates(db)  # no hace nada si no queda ninguna
+    finally:
+        db.close()
+
+
+def upgrade(bind=engine):
+    models.Base.metadata.create_all(bind=bind)
+    for name in ensure_columns(bind):
+        print(f"Columna agregada: {name}")
+    for name in migrate_native_types(bind):
+        print(f"Columna migrada: {name}")
+    for name in ensure_indexes(bind):
+        print(f"Índice creado: {name}")
+    if backfill_ledger():
+        print("Ledger armado con los saldos existentes")
+    if backfill_card_installments():
+        print("Cuotas de tarjeta calculadas")
+    if backfill_category_totals():
+        print("Resumen mensual por categoría calculado")
+    converted = backfill_legacy_subscriptions()
+    if converted:
+        print(f"Suscripciones convertidas a cobros mensuales: {converted}")
+
+
+if __name__ == "__main__":
+    upgrade()
+    print("¡Migraciones listas!")
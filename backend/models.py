@@ -1,7 +1,19 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Numeric, Date, DateTime, Text, Index, UniqueConstraint, func
 from sqlalchemy.orm import relationship
+from decimal import Decimal, ROUND_HALF_UP
 from database import Base
 
+# Montos en punto fijo (2 decimales) para que los saldos no acumulen error de float
+Money = Numeric(14, 2)
+CENT = Decimal("0.01")
+
+def to_money(value) -> Decimal:
+    # Pasamos por str para no arrastrar el error binario del float
+    return Decimal(str(value or 0)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+# Cotizaciones con 6 decimales (1 ARS = 0.000850 USD no entra en Money)
+Rate = Numeric(18, 6)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -22,8 +34,8 @@ class Account(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    balance = Column(Float, default=0.0)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    balance = Column(Money, default=0)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     currency = Column(String, default="ARS")
 
     owner = relationship("User", back_populates="accounts")
@@ -34,41 +46,60 @@ class Category(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
 
 class Transaction(Base):
     __tablename__ = "transactions"
 
     id = Column(Integer, primary_key=True, index=True)
-    amount = Column(Float)
+    amount = Column(Money)
     description = Column(String)
-    date = Column(String)
+    date = Column(Date)
     category_id = Column(Integer, ForeignKey("categories.id"))
     account_id = Column(Integer, ForeignKey("accounts.id"))
 
     account = relationship("Account", back_populates="transactions")
 
+    # Índice para listar/paginar por cuenta y fecha sin escanear toda la tabla
+    __table_args__ = (
+        Index("ix_transactions_account_date_id", "account_id", "date", "id"),
+    )
+
 class Subscription(Base):
     __tablename__ = "subscriptions"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    price = Column(Float)
+    price = Column(Money)
     currency = Column(String, default="ARS")
     billing_day = Column(Integer)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     card_id = Column(Integer, ForeignKey("credit_cards.id"), nullable=True)
 
     owner = relationship("User", back_populates="subscriptions")
 
+class SubscriptionCharge(Base):
+    __tablename__ = "subscription_charges"
+
+    # Un cobro por suscripción y mes: la restricción única hace idempotente al materializador
+    id = Column(Integer, primary_key=True, index=True)
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id"), nullable=False)
+    period = Column(String(7), nullable=False)  # "YYYY-MM"
+    # Si borran la compra el cobro queda (sin compra) para que el job no lo vuelva a generar
+    purchase_id = Column(Integer, ForeignKey("card_purchases.id", ondelete="SET NULL"), nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("subscription_id", "period", name="uq_subscription_charges_sub_period"),
+    )
+
 class CreditCard(Base):
     __tablename__ = "credit_cards"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    limit = Column(Float)
+    limit = Column(Money)
     closing_day = Column(Integer)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
 
     owner = relationship("User", back_populates="credit_cards")
     purchases = relationship("CardPurchase", back_populates="card")
@@ -78,14 +109,35 @@ class CardPurchase(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     description = Column(String)
-    amount = Column(Float)
+    amount = Column(Money)
     currency = Column(String)
     installments = Column(Integer)
-    date = Column(String)
+    date = Column(Date)
     is_recurring = Column(Boolean, default=False)
-    card_id = Column(Integer, ForeignKey("credit_cards.id"))
+    card_id = Column(Integer, ForeignKey("credit_cards.id"), index=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)  # opcional, para presupuestos
 
     card = relationship("CreditCard", back_populates="purchases")
+    installment_rows = relationship("CardInstallment", back_populates="purchase",
+                                    cascade="all, delete-orphan")
+
+class CardInstallment(Base):
+    __tablename__ = "card_installments"
+
+    # Una fila por cuota: el resumen de un mes es un lookup por (card_id, period)
+    id = Column(Integer, primary_key=True, index=True)
+    purchase_id = Column(Integer, ForeignKey("card_purchases.id"), nullable=False, index=True)
+    card_id = Column(Integer, ForeignKey("credit_cards.id"), nullable=False)
+    period = Column(String(7), nullable=False)  # "YYYY-MM" del resumen
+    number = Column(Integer, nullable=False)
+    amount = Column(Money)
+    currency = Column(String)
+
+    purchase = relationship("CardPurchase", back_populates="installment_rows")
+
+    __table_args__ = (
+        Index("ix_card_installments_card_period", "card_id", "period"),
+    )
 
 # --- MÓDULO CLIENTES ---
 
@@ -96,7 +148,7 @@ class Client(Base):
     name = Column(String, index=True)
     email = Column(String, nullable=True)
     phone = Column(String, nullable=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
 
     owner = relationship("User", back_populates="clients")
     jobs = relationship("Job", back_populates="client")
@@ -106,10 +158,10 @@ class Job(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     description = Column(String)
-    amount = Column(Float)
+    amount = Column(Money)
     is_paid = Column(Boolean, default=False)
-    date = Column(String)
-    client_id = Column(Integer, ForeignKey("clients.id"))
+    date = Column(Date)
+    client_id = Column(Integer, ForeignKey("clients.id"), index=True)
     currency = Column(String, default="ARS")
 
     client = relationship("Client", back_populates="jobs")
@@ -119,10 +171,100 @@ class Goal(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
-    target_amount = Column(Float) 
-    current_amount = Column(Float, default=0.0)
+    target_amount = Column(Money) 
+    current_amount = Column(Money, default=0)
     currency = Column(String, default="ARS")
-    deadline = Column(String) 
-    user_id = Column(Integer, ForeignKey("users.id"))
+    deadline = Column(Date, nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+
+    owner = relationship("User", back_populates="goals")
+
+# --- MÓDULO LEDGER ---
+# Libro mayor append-only: cada movimiento de saldo deja un asiento con el
+# saldo corrido de la cuenta. Nunca se editan, solo se agregan.
+
+class LedgerEntry(Base):
+    __tablename__ = "ledger_entries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    transaction_id = Column(Integer, ForeignKey("transactions.id"), nullable=True)
+    amount = Column(Money, nullable=False)
+    balance_after = Column(Money, nullable=False)  # saldo al registrarlo (orden de carga, no de fecha)
+    date = Column(Date, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_ledger_entries_account_date_id", "account_id", "date", "id"),
+    )
+
+class BalanceSnapshot(Base):
+    __tablename__ = "balance_snapshots"
+
+    # Saldo de la cuenta al cierre del mes "YYYY-MM"
+    id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    month = Column(String(7), nullable=False)
+    balance = Column(Money, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("account_id", "month", name="uq_balance_snapshots_account_month"),
+    )
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # Respuesta guardada de un POST con Idempotency-Key; se borra al vencer
+    key = Column(String(64), primary_key=True)  # sha256 de (clave, método, path)
+    fingerprint = Column(String(64), nullable=False)  # sha256 del body del pedido
+    status_code = Column(Integer, nullable=True)  # NULL = el pedido original sigue en curso
+    content_type = Column(String(100), nullable=True)
+    body = Column(Text, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    # Contador por usuario que sube con cada escritura (user_id 0 = datos globales)
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(Integer, nullable=False, default=0)
+
+class ExchangeRate(Base):
+    __tablename__ = "exchange_rates"
+
+    # Cuántas unidades de la moneda de referencia (ARS) vale 1 unidad de "currency" ese día
+    id = Column(Integer, primary_key=True, index=True)
+    currency = Column(String(3), nullable=False)
+    date = Column(Date, nullable=False)
+    rate = Column(Rate, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("currency", "date", name="uq_exchange_rates_currency_date"),
+    )
+
+class MonthlyCategoryTotal(Base):
+    __tablename__ = "monthly_category_totals"
+
+    # Resumen de transactions por (usuario, mes, categoría, moneda); lo mantiene rollup.py
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    month = Column(String(7), primary_key=True)  # "YYYY-MM"
+    category_id = Column(Integer, primary_key=True, autoincrement=False)  # 0 = sin categoría
+    currency = Column(String, primary_key=True)
+    total = Column(Money, nullable=False, default=0)  # suma con signo
+    expense = Column(Money, nullable=False, default=0)  # solo egresos, en positivo
+    count = Column(Integer, nullable=False, default=0)
+    card_expense = Column(Money, nullable=False, default=0)  # cuotas de tarjeta que caen en el mes
+
+class Budget(Base):
+    __tablename__ = "budgets"
+
+    # Tope mensual de gasto por categoría y moneda
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    currency = Column(String, nullable=False, default="ARS")
+    limit = Column(Money, nullable=False)
 
-    owner = relationship("User", back_populates="goals")
\ No newline at end of file
+    __table_args__ = (
+        UniqueConstraint("user_id", "category_id", "currency", name="uq_budgets_user_category_currency"),
+    )
@@ -0,0 +1,55 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+
+
+# --- HASHING DE CONTRASEÑAS ---
+# bcrypt tarda ~250 ms por hash a propósito. Para que una ola de logins no
+# ocupe los threads de FastAPI, el cálculo corre en un pool de procesos
+# acotado y los endpoints lo esperan con await.
+# Este módulo no importa nada de la app: los procesos hijos lo cargan solo.
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", 2))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_executor = None
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update(plain_password: str, hashed_password: str):
+    # (válida, hash_nuevo): hash_nuevo viene si el costo configurado cambió
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PASSWORD_WORKERS)
+    return _executor
+
+
+async def hash_password_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), hash_password, password)
+
+
+async def verify_and_update_async(plain_password: str, hashed_password: str):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), verify_and_update, plain_password, hashed_password)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,123 @@
+from datetime import date
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+import models
+import crud
+
+
+# --- PROYECCIÓN DE METAS ---
+# Estima cuándo se completa cada meta de un usuario, todas juntas:
+#   1. Ritmo propio: promedio ponderado (los meses recientes pesan más) de
+#      los depósitos "Ahorro para meta" de los últimos HISTORY_MONTHS meses
+#      completos. Es una matriz metas x meses que se resuelve con NumPy.
+#   2. Metas sin depósitos recientes: se reparten en partes iguales lo que
+#      sobra del flujo neto mensual de su moneda (neto + lo ya ahorrado en
+#      metas, menos el ritmo de las metas que sí vienen depositando).
+# Con el ritmo sale la cantidad de meses que faltan, la fecha estimada, si
+# llega antes del deadline y cuánto habría que depositar por mes para llegar.
+# Si faltan más de MAX_MONTHS meses la meta queda sin fecha estimada.
+
+HISTORY_MONTHS = 6
+MAX_MONTHS = 1200  # más de 100 años a este ritmo cuenta como "no se llega"
+DEPOSIT_PREFIX = "Ahorro para meta: "  # descripción que arma deposit_to_goal
+
+
+def _add_months(start: date, months: int) -> date:
+    total = start.year * 12 + (start.month - 1) + months
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _months_between(start: date, end: date) -> int:
+    return (end.year - start.year) * 12 + (end.month - start.month)
+
+
+def _deposit_history(db: Session, user_id: int, since: date, until: date, month_index):
+    # {(nombre de meta, moneda): [depósitos por mes]} agrupado en SQL
+    month = crud.month_of(db, models.Transaction.date)
+    rows = db.query(models.Transaction.description, models.Account.currency, month, func.sum(-models.Transaction.amount))\
+             .join(models.Account, models.Transaction.account_id == models.Account.id)\
+             .filter(models.Account.user_id == user_id)\
+             .filter(models.Transaction.description.startswith(DEPOSIT_PREFIX))\
+             .filter(models.Transaction.date >= since, models.Transaction.date < until)\
+             .group_by(models.Transaction.description, models.Account.currency, month)\
+             .all()
+    history = {}
+    for description, currency, m, total in rows:
+        key = (description[len(DEPOSIT_PREFIX):], currency)
+        history.setdefault(key, [0.0] * len(month_index))[month_index[m]] = float(total or 0)
+    return history
+
+
+def project_goals(db: Session, user_id: int, months: int = HISTORY_MONTHS, today: Optional[date] = None):
+    import numpy as np  # solo lo carga quien pide proyecciones
+
+    today = today or date.today()
+    goals = db.query(models.Goal).filter(models.Goal.user_id == user_id).order_by(models.Goal.id).all()
+    if not goals:
+        return []
+
+    this_month = today.replace(day=1)
+    since = _add_months(this_month, -months)
+    month_keys = [_add_months(since, i).strftime("%Y-%m") for i in range(months)]
+    month_index = {m: i for i, m in enumerate(month_keys)}
+
+    # --- MATRICES METAS x MESES ---
+    history = _deposit_history(db, user_id, since, this_month, month_index)
+    deposits = np.array([history.get((g.name, g.currency), [0.0] * months) for g in goals], dtype=float)
+    weights = np.arange(1, months + 1, dtype=float)
+    pace = deposits @ weights / weights.sum()
+
+    target = np.array([float(g.target_amount or 0) for g in goals])
+    current = np.array([float(g.current_amount or 0) for g in goals])
+    remaining = np.maximum(target - current, 0.0)
+    done = remaining <= 0
+
+    # --- CAPACIDAD DE AHORRO POR MONEDA (FLUJO NETO MENSUAL) ---
+    currencies = np.array([g.currency for g in goals])
+    net = {}
+    for row in crud.get_monthly_cashflow(db, user_id=user_id, months=months, end=this_month):
+        net[row["currency"]] = net.get(row["currency"], 0.0) + row["net"]
+
+    rate = pace.copy()
+    for currency in np.unique(currencies):
+        in_currency = currencies == currency
+        saved = deposits[in_currency].sum() / months  # los depósitos ya restaron del neto
+        free = net.get(currency, 0.0) / months + saved - pace[in_currency & ~done].sum()
+        idle = in_currency & ~done & (pace <= 0)
+        if idle.any() and free > 0:
+            rate[idle] = free / idle.sum()
+
+    # --- MESES FALTANTES, FECHAS Y DEADLINES ---
+    with np.errstate(divide="ignore", invalid="ignore"):
+        months_left = np.where(done, 0.0, np.where(rate > 0, np.ceil(remaining / rate), np.inf))
+        months_left[months_left > MAX_MONTHS] = np.inf
+        to_deadline = np.array([
+            max(_months_between(this_month, g.deadline), 1) if g.deadline else np.nan for g in goals
+        ])
+        required = np.where(np.isnan(to_deadline), np.nan, remaining / to_deadline)
+
+    projections = []
+    for i, goal in enumerate(goals):
+        finite = bool(np.isfinite(months_left[i]))
+        completion = _add_months(this_month, int(months_left[i])) if finite and not done[i] else (today if done[i] else None)
+        on_track = None
+        if goal.deadline is not None:
+            on_track = bool(done[i] or (completion is not None and completion <= goal.deadline))
+        projections.append({
+            "goal_id": goal.id,
+            "name": goal.name,
+            "currency": goal.currency,
+            "target_amount": float(target[i]),
+            "current_amount": float(current[i]),
+            "remaining": float(remaining[i]),
+            "monthly_deposit_avg": round(float(pace[i]), 2),
+            "projected_monthly": round(float(rate[i]), 2),
+            "source": "completed" if done[i] else ("deposits" if pace[i] > 0 else ("cashflow" if rate[i] > 0 else "none")),
+            "months_to_complete": int(months_left[i]) if finite else None,
+            "estimated_completion": completion,
+            "deadline": goal.deadline,
+            "on_track": on_track,
+            "required_monthly": None if np.isnan(required[i]) else round(float(required[i]), 2),
+        })
+    return projections
@@ -0,0 +1,148 @@
+import os
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+from sqlalchemy import case, event, func, literal, select, union_all
+from sqlalchemy.orm import Session
+import models
+from models import Rate, to_money
+from cache import make_cache
+
+
+# --- COTIZACIONES Y CONVERSIÓN DE MONEDAS ---
+# exchange_rates guarda, por día, cuántos pesos (REFERENCE_CURRENCY) vale
+# una unidad de cada moneda. Para una fecha sin cotización se usa la última
+# anterior. Convertir X -> Y es rate(X) / rate(Y).
+# rate_on() memoiza por (moneda, fecha) en una caché LRU; los totales
+# convertidos resuelven la cotización dentro del mismo SQL (subconsulta
+# correlacionada sobre el índice único (currency, date)), sin traer filas.
+
+REFERENCE_CURRENCY = os.getenv("REFERENCE_CURRENCY", "ARS")
+_cache = make_cache("exchange_rates", maxsize=int(os.getenv("RATE_CACHE_SIZE", 4096)),
+                    ttl=int(os.getenv("RATE_CACHE_TTL", 3600)))
+_MISSING = ""  # en la caché: "ya buscamos y no hay cotización"
+# SQLite guarda un NUMERIC sin decimales como INTEGER y ahí "/" trunca (1 / 1200 = 0).
+# Multiplicar por este 1 lo evita; en Postgres es numeric y no cambia nada.
+_ONE = literal(Decimal(1), Rate)
+
+
+def invalidate():
+    _cache.clear()
+
+
+def rate_on(db: Session, currency: str, on: date) -> Optional[Decimal]:
+    if currency == REFERENCE_CURRENCY:
+        return Decimal(1)
+    key = f"{currency}:{on.isoformat()}"
+    cached = _cache.get(key)
+    if cached is not None:
+        return Decimal(cached) if cached != _MISSING else None
+
+    rate = db.query(models.ExchangeRate.rate)\
+             .filter(models.ExchangeRate.currency == currency, models.ExchangeRate.date <= on)\
+             .order_by(models.ExchangeRate.date.desc())\
+             .limit(1)\
+             .scalar()
+    _cache.set(key, str(rate) if rate is not None else _MISSING)
+    return Decimal(str(rate)) if rate is not None else None
+
+
+def convert(db: Session, amount, from_currency: str, to_currency: str, on: date) -> Optional[Decimal]:
+    if from_currency == to_currency:
+        return to_money(amount)
+    source, target = rate_on(db, from_currency, on), rate_on(db, to_currency, on)
+    if source is None or target is None:
+        return None
+    return to_money(Decimal(str(amount)) * source / target)
+
+
+def set_rate(db: Session, currency: str, rate, on: Optional[date] = None):
+    # Alta o reemplazo de la cotización del día (no hace commit; la caché se limpia al commitear)
+    on = on or date.today()
+    row = db.query(models.ExchangeRate).filter_by(currency=currency, date=on).first()
+    if row is None:
+        row = models.ExchangeRate(currency=currency, date=on)
+        db.add(row)
+    row.rate = Decimal(str(rate))
+    event.listen(db, "after_commit", lambda session: invalidate(), once=True)
+    return row
+
+
+def record_pair(db: Session, from_currency: str, to_currency: str, rate, on: date):
+    # Guarda una cotización usada en una operación (ej. cobro en USD acreditado en pesos)
+    if not rate or from_currency == to_currency:
+        return None
+    if to_currency == REFERENCE_CURRENCY:
+        return set_rate(db, from_currency, rate, on)
+    if from_currency == REFERENCE_CURRENCY:
+        return set_rate(db, to_currency, Decimal(1) / Decimal(str(rate)), on)
+    return None
+
+
+def _rate_expr(currency, on):
+    # Cotización vigente para (moneda, fecha) dentro de la consulta
+    latest = select(models.ExchangeRate.rate)\
+        .where(models.ExchangeRate.currency == currency, models.ExchangeRate.date <= on)\
+        .order_by(models.ExchangeRate.date.desc())\
+        .limit(1)\
+        .scalar_subquery()
+    return case((currency == REFERENCE_CURRENCY, literal(1)), else_=latest)
+
+
+def net_worth(db: Session, user_id: int, base: str, on: Optional[date] = None):
+    # Cuentas + lo ahorrado en metas, agrupado por moneda en SQL
+    on = on or date.today()
+    holdings = union_all(
+        select(models.Account.currency.label("currency"), models.Account.balance.label("amount"))
+        .where(models.Account.user_id == user_id),
+        select(models.Goal.currency.label("currency"), models.Goal.current_amount.label("amount"))
+        .where(models.Goal.user_id == user_id),
+    ).subquery()
+    rows = db.execute(
+        select(holdings.c.currency, func.sum(holdings.c.amount), _rate_expr(holdings.c.currency, on))
+        .group_by(holdings.c.currency)
+        .order_by(holdings.c.currency)
+    ).all()
+
+    base_rate = rate_on(db, base, on)
+    total = to_money(0)
+    breakdown, missing = [], []
+    for currency, amount, rate in rows:
+        amount = to_money(amount)
+        converted = None
+        if rate is not None and base_rate is not None:
+            converted = to_money(amount * Decimal(str(rate)) / base_rate)
+            total += converted
+        else:
+            missing.append(currency if rate is None else base)
+        breakdown.append({"currency": currency, "amount": float(amount),
+                          "rate": float(rate) if rate is not None else None,
+                          "converted": float(converted) if converted is not None else None})
+    return {"base": base, "date": on, "total": float(total), "breakdown": breakdown,
+            "missing_rates": sorted(set(missing))}
+
+
+def converted_cashflow(db: Session, user_id: int, base: str, months: int = 6):
+    # Ingresos/gastos por mes convertidos a "base" con la cotización de la fecha de cada movimiento
+    import crud
+
+    month = crud.month_of(db, models.Transaction.date)
+    # Todo en numeric: monto * cotización de origen / cotización de la base, a la fecha del movimiento
+    value = models.Transaction.amount * _rate_expr(models.Account.currency, models.Transaction.date) * _ONE \
+        / _rate_expr(literal(base), models.Transaction.date)
+    income = func.sum(case((models.Transaction.amount > 0, value), else_=0))
+    expense = func.sum(case((models.Transaction.amount < 0, -value), else_=0))
+    unconverted = func.sum(case((value == None, 1), else_=0))
+
+    rows = db.query(month.label("month"), income, expense, unconverted)\
+             .join(models.Account, models.Transaction.account_id == models.Account.id)\
+             .filter(models.Account.user_id == user_id)\
+             .filter(models.Transaction.date >= crud._months_back(months))\
+             .group_by(month)\
+             .order_by(month)\
+             .all()
+    return [
+        {"month": m, "base": base, "income": float(to_money(inc)), "expense": float(to_money(exp)),
+         "net": float(to_money(inc) - to_money(exp)), "unconverted": int(missing or 0)}
+        for m, inc, exp, missing in rows
+    ]
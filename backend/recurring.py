@@ -0,0 +1,211 @@
+import calendar
+import os
+import asyncio
+from datetime import date
+from typing import Optional
+from sqlalchemy import and_, exists, func, insert, literal
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import models, statements, versions, ledger
+from models import to_money
+
+
+# --- COBROS RECURRENTES DE SUSCRIPCIONES ---
+# Cada mes, cada suscripción con tarjeta genera una compra de 1 cuota con
+# fecha en su billing_day. Lo hace un job en segundo plano para todos los
+# usuarios de una vez (INSERT masivos), y subscription_charges evita cobrar
+# dos veces el mismo mes aunque corran varios workers.
+# Con catch_up=True se generan también los meses que quedaron sin cobrar
+# (por ejemplo si el server estuvo caído).
+
+INTERVAL_SECONDS = int(os.getenv("RECURRING_INTERVAL_SECONDS", 3600))
+ENABLED = os.getenv("RECURRING_SCHEDULER", "1") == "1"
+
+
+def _period(value: date) -> str:
+    return value.strftime("%Y-%m")
+
+
+def billing_date(period: str, billing_day: int) -> date:
+    year, month = map(int, period.split("-"))
+    last_day = calendar.monthrange(year, month)[1]
+    return date(year, month, min(max(billing_day or 1, 1), last_day))
+
+
+def _periods_between(first: str, last: str):
+    period = first
+    while period <= last:
+        yield period
+        period = statements._add_months(period, 1)
+
+
+def _purchase(subscription, on: date):
+    return {
+        "description": f"Suscripción: {subscription.name}",
+        "amount": to_money(subscription.price),
+        "currency": subscription.currency,
+        "installments": 1,
+        "date": on,
+        "is_recurring": False,
+        "card_id": subscription.card_id,
+    }
+
+
+def due_charges(db: Session, today: date, catch_up: bool = True):
+    # Un solo query: suscripciones con tarjeta + último mes cobrado + cierre de la tarjeta
+    last_charged = db.query(models.SubscriptionCharge.subscription_id,
+                            func.max(models.SubscriptionCharge.period).label("period"))\
+                     .group_by(models.SubscriptionCharge.subscription_id)\
+                     .subquery()
+    rows = db.query(models.Subscription, last_charged.c.period, models.CreditCard.closing_day)\
+             .join(models.CreditCard, models.Subscription.card_id == models.CreditCard.id)\
+             .outerjoin(last_charged, last_charged.c.subscription_id == models.Subscription.id)\
+             .all()
+
+    current = _period(today)
+    due = []
+    for subscription, last_period, closing_day in rows:
+        if last_period is None or not catch_up:
+            first = current
+        else:
+            first = statements._add_months(last_period, 1)
+        for period in _periods_between(first, current):
+            on = billing_date(period, subscription.billing_day)
+            if on <= today:
+                due.append((subscription, period, on, closing_day))
+    return due
+
+
+def materialize_due(db: Session, today: Optional[date] = None, catch_up: bool = True):
+    today = today or date.today()
+    due = due_charges(db, today, catch_up=catch_up)
+    if not due:
+        return 0
+
+    try:
+        purchase_ids = db.execute(
+            insert(models.CardPurchase).returning(models.CardPurchase.id, sort_by_parameter_order=True),
+            [_purchase(subscription, on) for subscription, _, on, _ in due],
+        ).scalars().all()
+
+        db.execute(insert(models.SubscriptionCharge), [
+            {"subscription_id": subscription.id, "period": period, "purchase_id": purchase_id}
+            for (subscription, period, _, _), purchase_id in zip(due, purchase_ids)
+        ])
+        db.execute(insert(models.CardInstallment), [
+            {"purchase_id": purchase_id, "card_id": subscription.card_id,
+             "period": statements.first_period(on, closing_day), "number": 1,
+             "amount": to_money(subscription.price), "currency": subscription.currency}
+            for (subscription, _, on, closing_day), purchase_id in zip(due, purchase_ids)
+        ])
+        versions.bump(db, *{subscription.user_id for subscription, _, _, _ in due})
+        db.commit()
+    except IntegrityError:
+        # Otro worker ya generó estos cobros: no hacemos nada
+        db.rollback()
+        return 0
+    return len(due)
+
+
+def charge_now(db: Session, subscription: models.Subscription):
+    # Primer cobro al crear la suscripción, con fecha de hoy (no hace commit)
+    if not subscription.card_id:
+        return None
+    today = date.today()
+    purchase = models.CardPurchase(**_purchase(subscription, today))
+    db.add(purchase)
+    card = db.get(models.CreditCard, subscription.card_id)
+    statements.materialize(db, purchase, card.closing_day if card else None)
+    db.flush()
+    db.add(models.SubscriptionCharge(subscription_id=subscription.id, period=_period(today),
+                                     purchase_id=purchase.id))
+    return purchase
+
+
+def has_legacy_templates(db: Session) -> bool:
+    # ¿Queda alguna compra is_recurring de una suscripción con tarjeta que todavía no tiene cobros?
+    purchase, subscription = models.CardPurchase, models.Subscription
+    pending = db.query(purchase.id)\
+                .join(subscription, and_(subscription.card_id == purchase.card_id,
+                                         purchase.description == literal("Suscripción: ") + subscription.name))\
+                .filter(purchase.is_recurring == True,
+                        ~exists().where(models.SubscriptionCharge.subscription_id == subscription.id))
+    return db.query(pending.exists()).scalar()
+
+
+def convert_legacy_templates(db: Session):
+    # Antes, crear una suscripción dejaba una compra is_recurring=True que el
+    # front repetía todos los meses. La convertimos en el cobro de su mes para
+    # que no se sume dos veces con los cobros generados.
+    # Es una conversión de una sola vez: si no queda nada viejo, no recorremos nada.
+    if not has_legacy_templates(db):
+        return 0
+    converted = 0
+    charged = {row[0] for row in db.query(models.SubscriptionCharge.subscription_id).distinct()}
+    for subscription in db.query(models.Subscription).filter(models.Subscription.card_id != None).all():
+        if subscription.id in charged:
+            continue
+        template = db.query(models.CardPurchase)\
+                     .filter(models.CardPurchase.card_id == subscription.card_id,
+                             models.CardPurchase.is_recurring == True,
+                             models.CardPurchase.description == f"Suscripción: {subscription.name}")\
+                     .order_by(models.CardPurchase.date)\
+                     .first()
+        if template is None or template.date is None:
+            continue
+        template.is_recurring = False
+        card = db.get(models.CreditCard, template.card_id)
+        statements.materialize(db, template, card.closing_day if card else None)
+        db.add(models.SubscriptionCharge(subscription_id=subscription.id,
+                                         period=_period(template.date), purchase_id=template.id))
+        converted += 1
+    db.commit()
+    return converted
+
+
+async def run_scheduler(session_factory, interval: int = INTERVAL_SECONDS):
+    # Loop del job: corre al arrancar (catch-up) y después cada "interval" segundos.
+    # También guarda los snapshots de saldo del mes que cerró.
+    # Antes del primer ciclo convierte las suscripciones creadas con el esquema viejo (si quedan).
+    from fastapi.concurrency import run_in_threadpool
+
+    def _run():
+        db = session_factory()
+        try:
+            created = materialize_due(db)
+            # De paso, el cierre del mes anterior para que ledger.balance_at no sume toda la historia
+            snapshots = ledger.ensure_monthly_snapshots(db)
+            if snapshots:
+                print(f"Snapshots de saldo guardados: {snapshots}")
+            return created
+        finally:
+            db.close()
+
+    db = session_factory()
+    try:
+        await run_in_threadpool(convert_legacy_templates, db)
+    except Exception as e:
+        print(f"Error convirtiendo suscripciones viejas: {e}")
+    finally:
+        db.close()
+
+    while True:
+        try:
+            created = await run_in_threadpool(_run)
+            if created:
+                print(f"Cobros recurrentes generados: {created}")
+        except Exception as e:
+            print(f"Error generando cobros recurrentes: {e}")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    import sys
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        catch_up = "--no-catch-up" not in sys.argv
+        print(f"Cobros generados: {materialize_due(db, catch_up=catch_up)}")
+    finally:
+        db.close()
@@ -0,0 +1,148 @@
+import os
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa el JSON estándar
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # opcional: sin brotli solo comprimimos con gzip
+    brotli = None
+
+
+# --- RESPUESTAS HTTP: JSON RÁPIDO Y COMPRESIÓN ---
+# JSONResponse serializa con orjson si está instalado (varias veces más
+# rápido que json.dumps en listas largas). El middleware comprime con
+# brotli o gzip según Accept-Encoding, solo si la respuesta supera
+# COMPRESSION_MIN_SIZE bytes: en respuestas chicas no vale la pena la CPU.
+# El middleware es ASGI puro (solo usa Headers/MutableHeaders de Starlette),
+# sin heredar de las clases internas de su GZipMiddleware.
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1000))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4))
+EXCLUDED_CONTENT_TYPES = ("text/event-stream",)  # streams que el cliente lee de a eventos
+
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+else:
+    FastJSONResponse = JSONResponse
+
+
+def _accepts(header: str, encoding: str) -> bool:
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+class _Gzip:
+    encoding = "gzip"
+
+    def __init__(self, level: int = GZIP_LEVEL):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # formato gzip
+
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        data = self._compressor.compress(body)
+        return data + self._compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+
+class _Brotli:
+    encoding = "br"
+
+    def __init__(self, quality: int = BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        data = self._compressor.process(body)
+        return data + (self._compressor.flush() if more_body else self._compressor.finish())
+
+
+class _CompressedSend:
+    # Envuelve el "send" de ASGI: retiene el http.response.start (y el body, hasta
+    # COMPRESSION_MIN_SIZE bytes) para decidir si comprime y ajustar los headers.
+    # Juntar los primeros trozos hace falta porque los middlewares de Starlette
+    # mandan hasta las respuestas chicas como streaming (more_body=True).
+    def __init__(self, send, encoder, minimum_size: int):
+        self.send = send
+        self.encoder = encoder
+        self.minimum_size = minimum_size
+        self.start = None
+        self.skip = False
+        self.pending = b""
+        self.compressing = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            self.start = message
+            self.skip = "content-encoding" in headers or \
+                headers.get("content-type", "").startswith(EXCLUDED_CONTENT_TYPES)
+            return
+
+        if message["type"] != "http.response.body":  # pathsend y otros: tal cual
+            await self._send_start()
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start is None:  # ya decidimos: siguientes trozos de la respuesta
+            if self.compressing:
+                message["body"] = self.encoder.compress(body, more_body)
+            await self.send(message)
+            return
+
+        if self.skip:
+            await self._send_start()
+            await self.send(message)
+            return
+
+        self.pending += body
+        if more_body and len(self.pending) < self.minimum_size:
+            return  # todavía no sabemos si la respuesta es grande
+        body, self.pending = self.pending, b""
+
+        if len(body) >= self.minimum_size:
+            headers = MutableHeaders(raw=self.start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if self.encoder is not None:
+                self.compressing = True
+                body = self.encoder.compress(body, more_body)
+                headers["Content-Encoding"] = self.encoder.encoding
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+        await self._send_start()
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    async def _send_start(self):
+        if self.start is not None:
+            start, self.start = self.start, None
+            await self.send(start)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = Headers(scope=scope).get("Accept-Encoding", "")
+        if brotli is not None and _accepts(accept, "br"):
+            encoder = _Brotli()
+        elif _accepts(accept, "gzip"):
+            encoder = _Gzip()
+        else:
+            encoder = None
+        await self.app(scope, receive, _CompressedSend(send, encoder, self.minimum_size))
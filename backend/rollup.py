@@ -0,0 +1,301 @@
+from sqlalchemy import case, delete, event, func, inspect, select, update
+from sqlalchemy.orm import Session
+import models, statements
+from models import to_money
+
+
+# --- RESUMEN MENSUAL POR CATEGORÍA ---
+# monthly_category_totals tiene una fila por (usuario, mes, categoría, moneda)
+# con la suma, los egresos y la cantidad de transacciones, más las cuotas de
+# tarjeta (de compras con categoría) que caen en el resumen de ese mes. Se actualiza con
+# deltas (UPSERT) en la misma transacción que cada alta/baja/cambio, así los
+# gráficos y los presupuestos leen unas pocas filas en vez de recorrer
+# transactions.
+# Las escrituras por el ORM se detectan solas (after_flush); los INSERT /
+# DELETE masivos tienen que llamar a add_rows() / add_card_rows() /
+# remove_account() a mano.
+#
+#   python rollup.py --rebuild [--user ID]   (lo recalcula desde cero)
+
+NO_CATEGORY = 0
+DEFAULT_CURRENCY = "ARS"
+_TRACKED = ("account_id", "category_id", "date", "amount")  # mismo orden que add_rows()
+_TRACKED_PURCHASE = ("card_id", "category_id", "date", "amount", "currency", "installments")  # add_card_rows()
+
+
+def _month(on) -> str:
+    return on.strftime("%Y-%m")
+
+
+def _delta(deltas, key):
+    return deltas.setdefault(key, [to_money(0), to_money(0), 0, to_money(0)])
+
+
+def _add(deltas, user_id, currency, category_id, on, amount, sign):
+    if on is None or amount is None:
+        return
+    amount = to_money(amount)
+    delta = _delta(deltas, (user_id, _month(on), category_id or NO_CATEGORY, currency or DEFAULT_CURRENCY))
+    delta[0] += sign * amount
+    delta[1] += sign * (-amount if amount < 0 else 0)
+    delta[2] += sign
+
+
+def _add_purchase(deltas, user_id, closing_day, currency, category_id, on, amount, installments, sign):
+    # Cada cuota ("amount" es el monto de una cuota) suma en el mes de su resumen: desde
+    # el primer período de la compra según el cierre de la tarjeta (igual que statements.py)
+    if on is None or amount is None or category_id is None:
+        return
+    start = statements.first_period(on, closing_day)
+    for n in range(max(installments or 1, 1)):
+        key = (user_id, statements._add_months(start, n), category_id, currency or DEFAULT_CURRENCY)
+        _delta(deltas, key)[3] += sign * to_money(amount)
+
+
+def _upsert(db: Session, values):
+    table = models.MonthlyCategoryTotal
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.user_id, table.month, table.category_id, table.currency],
+            set_={"total": table.total + stmt.excluded.total,
+                  "expense": table.expense + stmt.excluded.expense,
+                  "count": table.count + stmt.excluded.count,
+                  "card_expense": table.card_expense + stmt.excluded.card_expense},
+        )
+        db.connection().execute(stmt)
+        return
+
+    for row in values:
+        updated = db.connection().execute(
+            update(table)
+            .where(table.user_id == row["user_id"], table.month == row["month"],
+                   table.category_id == row["category_id"], table.currency == row["currency"])
+            .values(total=table.total + row["total"], expense=table.expense + row["expense"],
+                    count=table.count + row["count"], card_expense=table.card_expense + row["card_expense"])
+        ).rowcount
+        if not updated:
+            db.connection().execute(table.__table__.insert().values(row))
+
+
+def apply(db: Session, deltas):
+    # deltas: {(user_id, month, category_id, currency): [total, expense, count, card_expense]}; no hace commit
+    values = [
+        {"user_id": user_id, "month": month, "category_id": category_id, "currency": currency,
+         "total": total, "expense": expense, "count": count, "card_expense": card_expense}
+        for (user_id, month, category_id, currency), (total, expense, count, card_expense) in sorted(deltas.items())
+        if count or total or expense or card_expense
+    ]
+    if not values:
+        return
+    _upsert(db, values)
+
+    # Si una celda quedó sin transacciones ni cuotas la borramos
+    if any(row["count"] < 0 or row["card_expense"] < 0 for row in values):
+        table = models.MonthlyCategoryTotal
+        db.connection().execute(
+            delete(table).where(table.count <= 0, table.card_expense <= 0,
+                                table.user_id.in_({row["user_id"] for row in values}))
+        )
+
+
+def add_rows(db: Session, rows, sign: int = 1):
+    # rows: (account_id, category_id, date, amount) de un INSERT masivo (sign=-1 para un DELETE)
+    rows = list(rows)
+    if not rows:
+        return
+    accounts = {
+        account_id: (user_id, currency)
+        for account_id, user_id, currency in db.connection().execute(
+            select(models.Account.id, models.Account.user_id, models.Account.currency)
+            .where(models.Account.id.in_({row[0] for row in rows}))
+        )
+    }
+    deltas = {}
+    for account_id, category_id, on, amount in rows:
+        if account_id in accounts:
+            user_id, currency = accounts[account_id]
+            _add(deltas, user_id, currency, category_id, on, amount, sign)
+    apply(db, deltas)
+
+
+def add_card_rows(db: Session, rows, sign: int = 1):
+    # rows: (card_id, category_id, date, amount, currency, installments) de compras con tarjeta
+    rows = [row for row in rows if row[1] is not None]
+    if not rows:
+        return
+    cards = {
+        card_id: (user_id, closing_day)
+        for card_id, user_id, closing_day in db.connection().execute(
+            select(models.CreditCard.id, models.CreditCard.user_id, models.CreditCard.closing_day)
+            .where(models.CreditCard.id.in_({row[0] for row in rows}))
+        )
+    }
+    deltas = {}
+    for card_id, category_id, on, amount, currency, installments in rows:
+        if card_id in cards:
+            owner, closing_day = cards[card_id]
+            _add_purchase(deltas, owner, closing_day, currency, category_id, on, amount, installments, sign)
+    apply(db, deltas)
+
+
+def remove_account(db: Session, account_id: int):
+    # Antes de borrar en masa las transacciones de una cuenta: restamos sus totales
+    month = _month_expr(db)
+    t = models.Transaction
+    account = db.connection().execute(
+        select(models.Account.user_id, models.Account.currency).where(models.Account.id == account_id)
+    ).first()
+    if account is None:
+        return
+    rows = db.connection().execute(
+        select(month, t.category_id, func.sum(t.amount),
+               func.sum(case((t.amount < 0, -t.amount), else_=0)), func.count())
+        .where(t.account_id == account_id, t.date != None)
+        .group_by(month, t.category_id)
+    ).all()
+    deltas = {}
+    for m, category_id, total, expense, count in rows:
+        key = (account.user_id, m, category_id or NO_CATEGORY, account.currency or DEFAULT_CURRENCY)
+        delta = _delta(deltas, key)
+        delta[0] -= to_money(total)
+        delta[1] -= to_money(expense)
+        delta[2] -= count
+    apply(db, deltas)
+
+
+def _month_expr(db: Session):
+    import crud
+    return crud.month_of(db, models.Transaction.date)
+
+
+def rebuild(db: Session, user_id=None) -> int:
+    # Recalcula el resumen (de todos o de un usuario) con un solo INSERT ... SELECT; hace commit
+    table = models.MonthlyCategoryTotal
+    t = models.Transaction
+    month = _month_expr(db)
+    category = func.coalesce(t.category_id, NO_CATEGORY)
+    currency = func.coalesce(models.Account.currency, DEFAULT_CURRENCY)
+
+    source = select(models.Account.user_id, month, category, currency, func.sum(t.amount),
+                    func.sum(case((t.amount < 0, -t.amount), else_=0)), func.count())\
+        .join(models.Account, t.account_id == models.Account.id)\
+        .where(t.date != None)\
+        .group_by(models.Account.user_id, month, category, currency)
+    clear = delete(table)
+    if user_id is not None:
+        source = source.where(models.Account.user_id == user_id)
+        clear = clear.where(table.user_id == user_id)
+
+    db.execute(clear)
+    inserted = db.execute(table.__table__.insert().from_select(
+        ["user_id", "month", "category_id", "currency", "total", "expense", "count"], source
+    )).rowcount
+
+    # Cuotas de tarjeta: se reparten por mes en Python (una compra en 12 cuotas toca 12 meses)
+    purchases = select(models.CreditCard.user_id, models.CreditCard.closing_day,
+                       models.CardPurchase.currency, models.CardPurchase.category_id,
+                       models.CardPurchase.date, models.CardPurchase.amount, models.CardPurchase.installments)\
+        .join(models.CreditCard, models.CardPurchase.card_id == models.CreditCard.id)\
+        .where(models.CardPurchase.category_id != None)
+    if user_id is not None:
+        purchases = purchases.where(models.CreditCard.user_id == user_id)
+    deltas = {}
+    for owner, closing_day, currency, category_id, on, amount, installments in db.execute(purchases):
+        _add_purchase(deltas, owner, closing_day, currency, category_id, on, amount, installments, 1)
+    apply(db, deltas)
+    db.commit()
+    return inserted
+
+
+def totals(db: Session, user_id: int, first_month: str, last_month: str):
+    table = models.MonthlyCategoryTotal
+    rows = db.query(table)\
+             .filter(table.user_id == user_id, table.month >= first_month, table.month <= last_month)\
+             .order_by(table.month, table.expense.desc(), table.category_id)\
+             .all()
+    return [
+        {"month": r.month, "category_id": r.category_id or None, "currency": r.currency,
+         "total": float(r.total), "expense": float(r.expense), "count": r.count,
+         "card_expense": float(r.card_expense)}
+        for r in rows
+    ]
+
+
+# --- ESCRITURAS POR EL ORM ---
+def _values(obj, old: bool = False, tracked=_TRACKED):
+    state = inspect(obj)
+    values = []
+    for name in tracked:
+        history = state.attrs[name].history
+        if old and history.deleted:
+            values.append(history.deleted[0])
+        else:
+            values.append(getattr(obj, name))
+    return tuple(values)
+
+
+def _tracked_for(obj):
+    if isinstance(obj, models.Transaction):
+        return _TRACKED
+    if isinstance(obj, models.CardPurchase):
+        return _TRACKED_PURCHASE
+    return ()
+
+
+@event.listens_for(Session, "before_flush")
+def _load_deleted(session, flush_context, instances):
+    # Cargamos los valores de las que se van a borrar mientras la fila existe
+    for obj in session.deleted:
+        for name in _tracked_for(obj):
+            getattr(obj, name)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    changes = {_TRACKED: ([], []), _TRACKED_PURCHASE: ([], [])}
+    for obj in session.new:
+        tracked = _tracked_for(obj)
+        if tracked:
+            changes[tracked][0].append(_values(obj, tracked=tracked))
+    for obj in session.deleted:
+        tracked = _tracked_for(obj)
+        if tracked:
+            changes[tracked][1].append(_values(obj, old=True, tracked=tracked))
+    for obj in session.dirty:
+        tracked = _tracked_for(obj)
+        if tracked:
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in tracked):
+                changes[tracked][1].append(_values(obj, old=True, tracked=tracked))
+                changes[tracked][0].append(_values(obj, tracked=tracked))
+
+    for tracked, handler in ((_TRACKED, add_rows), (_TRACKED_PURCHASE, add_card_rows)):
+        added, removed = changes[tracked]
+        if added:
+            handler(session, added)
+        if removed:
+            handler(session, removed, sign=-1)
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Resumen mensual por categoría")
+    parser.add_argument("--rebuild", action="store_true", help="recalcula monthly_category_totals desde transactions")
+    parser.add_argument("--user", type=int, help="solo este usuario")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.error("nada para hacer (usá --rebuild)")
+
+    db = SessionLocal()
+    try:
+        print(f"Filas del resumen: {rebuild(db, user_id=args.user)}")
+    finally:
+        db.close()
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
-from datetime import datetime
+from datetime import date as Date
 
 # --- SCHEMAS DE USUARIO ---
 
@@ -35,6 +35,22 @@ class AccountResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class AccountBalanceAt(BaseModel):
+    account_id: int
+    date: Date
+    balance: float
+
+class LedgerEntryResponse(BaseModel):
+    id: int
+    account_id: int
+    transaction_id: Optional[int]
+    amount: float
+    balance_after: float
+    date: Date
+
+    class Config:
+        from_attributes = True
+
 class CategoryBase(BaseModel):
     name: str
 
@@ -46,6 +62,29 @@ class CategoryResponse(CategoryBase):
     class Config:
         from_attributes = True
 
+# --- SCHEMAS DE PRESUPUESTOS ---
+class BudgetCreate(BaseModel):
+    category_id: int
+    currency: str = Field(default="ARS", pattern=r"^[A-Z]{3}$")
+    limit: float = Field(gt=0)  # tope mensual
+
+class BudgetResponse(BudgetCreate):
+    id: int
+    user_id: int
+    class Config:
+        from_attributes = True
+
+class BudgetStatus(BaseModel):
+    budget_id: int
+    category_id: int
+    currency: str
+    month: str  # "YYYY-MM"
+    limit: float
+    spent: float  # egresos + cuotas de tarjeta del mes
+    remaining: float
+    percent: float
+    status: str  # "ok" | "warning" | "exceeded"
+
 # --- SCHEMAS DE TRANSACCIONES (Gastos/Ingresos) ---
 
 class TransactionCreate(BaseModel):
@@ -53,21 +92,86 @@ class TransactionCreate(BaseModel):
     category_id: int
     account_id: int
     description: Optional[str] = None
-    # La fecha es opcional, si no la mandan usamos "ahora"
-    date: Optional[datetime] = None 
+    # La fecha es opcional, si no la mandan usamos "hoy"
+    date: Optional[Date] = None
 
 class TransactionResponse(BaseModel):
     id: int
     account: AccountResponse
     amount: float
     description: Optional[str]
-    date: datetime
+    date: Date
     category_id: int
     account_id: int
 
     class Config:
         from_attributes = True
 
+# Respuesta del alta: además trae el estado del presupuesto de la categoría
+class TransactionCreated(TransactionResponse):
+    budget: Optional[BudgetStatus] = None
+
+# Versión liviana para listas largas: solo account_id en cada fila y las
+# cuentas van una sola vez en "accounts"
+class TransactionSlim(BaseModel):
+    id: int
+    amount: float
+    description: Optional[str]
+    date: Date
+    category_id: int
+    account_id: int
+
+class TransactionPage(BaseModel):
+    accounts: List[AccountResponse]
+    transactions: List[TransactionSlim]
+
+# --- SCHEMAS DE ANALYTICS ---
+class CashflowMonth(BaseModel):
+    month: str  # "YYYY-MM"
+    currency: str
+    income: float
+    expense: float
+    net: float
+
+class CategoryMonthTotal(BaseModel):
+    month: str  # "YYYY-MM"
+    category_id: Optional[int]
+    currency: str
+    total: float  # suma con signo
+    expense: float  # solo egresos
+    count: int
+    card_expense: float  # cuotas de tarjeta del mes
+
+class CurrencyBalance(BaseModel):
+    currency: str
+    balance: float
+
+class CategoryTotal(BaseModel):
+    category_id: Optional[int]
+    name: Optional[str]
+    currency: str
+    total: float
+
+class DashboardSummary(BaseModel):
+    month: str  # "YYYY-MM"
+    accounts: List[AccountResponse]
+    balances: List[CurrencyBalance]
+    cashflow: List[CashflowMonth]
+    history: List[CashflowMonth]  # últimos meses hasta el elegido, para el gráfico
+    categories: List[CategoryTotal]
+    transactions: List[TransactionSlim]  # movimientos del mes
+    category_list: List[CategoryResponse]  # opciones para el alta de movimientos
+
+# --- SCHEMAS DE IMPORTACIÓN ---
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+class ImportResult(BaseModel):
+    imported: int
+    skipped: int
+    errors: List[ImportRowError]
+
 class SubscriptionBase(BaseModel):
     name: str
     price: float
@@ -105,14 +209,40 @@ class CardPurchaseCreate(BaseModel):
     amount: float
     currency: str
     installments: int
-    date: str
+    date: Date
     is_recurring: bool
+    category_id: Optional[int] = None
 
 class CardPurchaseResponse(CardPurchaseCreate):
     id: int
     class Config:
         from_attributes = True
 
+class CardPurchaseCreated(CardPurchaseResponse):
+    budget: Optional[BudgetStatus] = None
+
+# --- SCHEMAS RESUMEN DE TARJETA ---
+class StatementItem(BaseModel):
+    purchase_id: int
+    description: Optional[str]
+    date: Date
+    currency: str
+    amount: float
+    installment: Optional[int]  # None en débitos automáticos
+    installments: Optional[int]
+    is_recurring: bool
+
+class StatementTotal(BaseModel):
+    currency: str
+    total: float
+
+class CardStatement(BaseModel):
+    card_id: int
+    period: str  # "YYYY-MM"
+    closing_date: Date
+    items: List[StatementItem]
+    totals: List[StatementTotal]
+
 # --- SCHEMAS CLIENTES ---
 class ClientBase(BaseModel):
     name: str
@@ -132,7 +262,7 @@ class ClientResponse(ClientBase):
 class JobCreate(BaseModel):
     description: str
     amount: float
-    date: str
+    date: Date
     currency: str
 
 class JobResponse(JobCreate):
@@ -142,6 +272,52 @@ class JobResponse(JobCreate):
     class Config:
         from_attributes = True
 
+class ClientWithJobs(ClientResponse):
+    # Solo viene cuando piden ?include=jobs
+    jobs: Optional[List[JobResponse]] = None
+
+class ClientTotal(BaseModel):
+    client_id: int
+    name: str
+    currency: str
+    total: float
+    jobs_paid: int
+
+# --- COTIZACIONES ---
+class ExchangeRateCreate(BaseModel):
+    currency: str = Field(pattern=r"^[A-Z]{3}$")
+    rate: float = Field(gt=0)  # unidades de la moneda de referencia por 1 "currency"
+    date: Optional[Date] = None
+
+class ExchangeRateResponse(BaseModel):
+    currency: str
+    date: Date
+    rate: float
+
+    class Config:
+        from_attributes = True
+
+class ConvertedBalance(BaseModel):
+    currency: str
+    amount: float
+    rate: Optional[float]  # None = no hay cotización cargada
+    converted: Optional[float]
+
+class NetWorth(BaseModel):
+    base: str
+    date: Date
+    total: float
+    breakdown: List[ConvertedBalance]
+    missing_rates: List[str]
+
+class ConvertedCashflowMonth(BaseModel):
+    month: str  # "YYYY-MM"
+    base: str
+    income: float
+    expense: float
+    net: float
+    unconverted: int  # transacciones sin cotización para su fecha
+
 # --- SCHEMA PARA PAGAR (SOLO RECIBE ID CUENTA) ---
 class JobPay(BaseModel):
     account_id: int
@@ -152,7 +328,13 @@ class GoalBase(BaseModel):
     name: str
     target_amount: float
     currency: str
-    deadline: str
+    deadline: Optional[Date] = None
+
+    # El formulario manda "" cuando no eligen fecha
+    @field_validator("deadline", mode="before")
+    @classmethod
+    def empty_deadline(cls, value):
+        return value or None
 
 class GoalCreate(GoalBase):
     pass
@@ -164,6 +346,22 @@ class GoalResponse(GoalBase):
     class Config:
         from_attributes = True
 
+class GoalProjection(BaseModel):
+    goal_id: int
+    name: str
+    currency: str
+    target_amount: float
+    current_amount: float
+    remaining: float
+    monthly_deposit_avg: float
+    projected_monthly: float  # ritmo usado para proyectar
+    source: str  # "deposits" | "cashflow" | "completed" | "none"
+    months_to_complete: Optional[int]  # None = a este ritmo no se completa
+    estimated_completion: Optional[Date]
+    deadline: Optional[Date]
+    on_track: Optional[bool]
+    required_monthly: Optional[float]  # para llegar al deadline
+
 # --- SCHEMA PARA DEPOSITAR EN META ---
 class GoalDeposit(BaseModel):
     account_id: int
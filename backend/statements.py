@@ -0,0 +1,115 @@
+import calendar
+from datetime import date
+from sqlalchemy.orm import Session
+import models
+from models import to_money
+
+
+# --- RESÚMENES DE TARJETA ---
+# Cada compra en cuotas se guarda "explotada" en card_installments (una fila
+# por cuota con el período del resumen en que cae). Así el resumen de un mes
+# es un lookup indexado por (card_id, period) en vez de recorrer todas las
+# compras históricas. Los débitos automáticos (is_recurring) no tienen fin,
+# por eso no se explotan: se suman aparte.
+# Igual que en el front, "amount" es el monto de cada cuota.
+
+def _add_months(period: str, months: int) -> str:
+    year, month = map(int, period.split("-"))
+    total = year * 12 + (month - 1) + months
+    return f"{total // 12:04d}-{total % 12 + 1:02d}"
+
+
+def closing_date(period: str, closing_day: int) -> date:
+    # Si el día de cierre no existe en el mes (31 en febrero), cierra el último día
+    year, month = map(int, period.split("-"))
+    last_day = calendar.monthrange(year, month)[1]
+    return date(year, month, min(closing_day or last_day, last_day))
+
+
+def first_period(purchase_date: date, closing_day: int) -> str:
+    # Lo comprado después del cierre entra en el resumen del mes siguiente
+    period = purchase_date.strftime("%Y-%m")
+    if purchase_date > closing_date(period, closing_day):
+        return _add_months(period, 1)
+    return period
+
+
+def materialize(db: Session, purchase: models.CardPurchase, closing_day: int):
+    # No hace commit: se guarda junto con la compra
+    purchase.installment_rows = []
+    if purchase.is_recurring:
+        return
+    start = first_period(purchase.date, closing_day)
+    purchase.installment_rows = [
+        models.CardInstallment(
+            card_id=purchase.card_id,
+            period=_add_months(start, n),
+            number=n + 1,
+            amount=purchase.amount,
+            currency=purchase.currency,
+        )
+        for n in range(max(purchase.installments or 1, 1))
+    ]
+
+
+def get_statement(db: Session, card: models.CreditCard, period: str):
+    items = []
+
+    installments = db.query(models.CardInstallment, models.CardPurchase)\
+                     .join(models.CardPurchase, models.CardInstallment.purchase_id == models.CardPurchase.id)\
+                     .filter(models.CardInstallment.card_id == card.id,
+                             models.CardInstallment.period == period)\
+                     .order_by(models.CardPurchase.date, models.CardPurchase.id)\
+                     .all()
+    for row, purchase in installments:
+        items.append({
+            "purchase_id": purchase.id,
+            "description": purchase.description,
+            "date": purchase.date,
+            "currency": row.currency,
+            "amount": float(row.amount or 0),
+            "installment": row.number,
+            "installments": purchase.installments,
+            "is_recurring": False,
+        })
+
+    # Débitos automáticos vigentes: empezaron en este período o antes
+    recurring = db.query(models.CardPurchase)\
+                  .filter(models.CardPurchase.card_id == card.id,
+                          models.CardPurchase.is_recurring == True,
+                          models.CardPurchase.date <= closing_date(period, card.closing_day))\
+                  .order_by(models.CardPurchase.date, models.CardPurchase.id)\
+                  .all()
+    for purchase in recurring:
+        items.append({
+            "purchase_id": purchase.id,
+            "description": purchase.description,
+            "date": purchase.date,
+            "currency": purchase.currency,
+            "amount": float(purchase.amount or 0),
+            "installment": None,
+            "installments": purchase.installments,
+            "is_recurring": True,
+        })
+
+    totals = {}
+    for item in items:
+        totals[item["currency"]] = totals.get(item["currency"], to_money(0)) + to_money(item["amount"])
+
+    return {
+        "card_id": card.id,
+        "period": period,
+        "closing_date": closing_date(period, card.closing_day),
+        "items": items,
+        "totals": [{"currency": c, "total": float(t)} for c, t in sorted(totals.items())],
+    }
+
+
+def rebuild(db: Session):
+    # Regenera las cuotas de todas las compras (bases anteriores a esta tabla)
+    db.query(models.CardInstallment).delete()
+    cards = {card.id: card.closing_day for card in db.query(models.CreditCard).all()}
+    for purchase in db.query(models.CardPurchase).all():
+        if purchase.date is not None:
+            materialize(db, purchase, cards.get(purchase.card_id))
+    db.commit()
@@ -0,0 +1,54 @@
+import itertools
+import os
+import sys
+import tempfile
+
+# La base de los tests es un SQLite nuevo en un directorio temporal; las
+# variables tienen que estar antes de importar database.py
+_TMP = tempfile.mkdtemp(prefix="finpro-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'test.db')}"
+os.environ["RECURRING_SCHEDULER"] = "0"
+os.environ.pop("ASYNC_DB", None)
+os.environ["CACHE_BACKEND"] = "memory"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+import main
+
+_emails = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture
+def db(client):
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(client):
+    # Un usuario nuevo por test, así los datos no se cruzan
+    response = client.post("/users/", json={"email": f"user{next(_emails)}@test.com", "password": "secreta"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.fixture
+def make_account(client, user):
+    def _make(balance=0, currency="ARS", name="Cuenta"):
+        response = client.post(f"/users/{user['id']}/accounts/",
+                               json={"name": name, "balance": balance, "currency": currency})
+        assert response.status_code == 200, response.text
+        return response.json()
+    return _make
@@ -0,0 +1,32 @@
+import models
+from test_card_rollup import _card, _purchase
+
+
+def test_budget_counts_card_purchase_in_its_statement_month(client, user):
+    card = _card(client, user, closing_day=25)
+    client.post(f"/users/{user['id']}/budgets/", json={"category_id": 1, "limit": 150})
+
+    created = _purchase(client, card, "2026-09-26", 200)
+    assert created["budget"]["month"] == "2026-10"
+    assert created["budget"]["status"] == "exceeded"
+
+    def spent(month):
+        [status] = client.get(f"/users/{user['id']}/budgets/", params={"month": month}).json()
+        return status["spent"]
+
+    assert spent("2026-09") == 0
+    assert spent("2026-10") == 200
+
+
+def test_budget_for_missing_or_foreign_category_is_404(client, db, user):
+    other = models.Category(name="Ajena", user_id=user["id"] + 1000)
+    db.add(other)
+    db.commit()
+    for category_id in (99999, other.id):
+        response = client.post(f"/users/{user['id']}/budgets/", json={"category_id": category_id, "limit": 10})
+        assert response.status_code == 404
+
+
+def test_budget_currency_must_be_an_iso_code(client, user):
+    response = client.post(f"/users/{user['id']}/budgets/", json={"category_id": 1, "limit": 10, "currency": "usd"})
+    assert response.status_code == 422
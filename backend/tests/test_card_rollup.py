@@ -0,0 +1,54 @@
+import models
+import rollup
+
+PERIODS = ["2026-09", "2026-10", "2026-11", "2026-12", "2027-01"]
+
+
+def _card(client, user, closing_day=25):
+    return client.post(f"/users/{user['id']}/credit-cards/",
+                       json={"name": "Visa", "limit": 100000, "closing_day": closing_day}).json()
+
+
+def _purchase(client, card, on, amount, installments=1, category_id=1):
+    response = client.post(f"/credit-cards/{card['id']}/purchases/",
+                           json={"description": "Compra", "amount": amount, "currency": "ARS",
+                                 "installments": installments, "date": on, "is_recurring": False,
+                                 "category_id": category_id})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _card_expense(db, user):
+    table = models.MonthlyCategoryTotal
+    rows = db.query(table.month, table.card_expense).filter(table.user_id == user["id"]).all()
+    return {month: float(total) for month, total in rows if total}
+
+
+def _statement_totals(client, card):
+    totals = {}
+    for period in PERIODS:
+        statement = client.get(f"/credit-cards/{card['id']}/statement", params={"period": period}).json()
+        total = sum(t["total"] for t in statement["totals"])
+        if total:
+            totals[period] = total
+    return totals
+
+
+def test_rollup_matches_statement_after_closing_day(client, db, user):
+    card = _card(client, user, closing_day=25)
+    _purchase(client, card, "2026-09-26", 100, installments=3)  # después del cierre: arranca en octubre
+    _purchase(client, card, "2026-09-25", 40)  # el día del cierre: entra en septiembre
+
+    expected = {"2026-09": 40.0, "2026-10": 100.0, "2026-11": 100.0, "2026-12": 100.0}
+    assert _statement_totals(client, card) == expected
+    assert _card_expense(db, user) == expected
+
+
+def test_rollup_rebuild_matches_incremental(client, db, user):
+    card = _card(client, user, closing_day=10)
+    _purchase(client, card, "2026-10-15", 30, installments=2)
+    _purchase(client, card, "2026-12-31", 20)
+    before = _card_expense(db, user)
+
+    rollup.rebuild(db, user_id=user["id"])
+    assert _card_expense(db, user) == before == _statement_totals(client, card)
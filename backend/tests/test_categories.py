@@ -0,0 +1,30 @@
+import models
+
+
+def _names(client, user, headers=None):
+    return client.get(f"/users/{user['id']}/categories/", headers=headers or {})
+
+
+def _add_behind_the_cache(db, **fields):
+    # Como si la categoría la hubiera creado otro worker: no pasa por invalidate_categories
+    db.add(models.Category(**fields))
+    db.commit()
+
+
+def test_own_category_from_another_worker_is_served_with_its_etag(client, db, user):
+    first = _names(client, user)
+    etag = first.headers["etag"]
+    assert _names(client, user, {"If-None-Match": etag}).status_code == 304
+
+    _add_behind_the_cache(db, name="Mascotas", user_id=user["id"])
+
+    second = _names(client, user, {"If-None-Match": etag})
+    assert second.status_code == 200
+    assert "Mascotas" in [c["name"] for c in second.json()]
+    assert second.headers["etag"] != etag
+
+
+def test_global_category_from_another_worker_is_served(client, db, user):
+    _names(client, user)
+    _add_behind_the_cache(db, name="Impuestos")
+    assert "Impuestos" in [c["name"] for c in _names(client, user).json()]
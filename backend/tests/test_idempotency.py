@@ -0,0 +1,39 @@
+from auth import create_access_token
+
+import models
+
+
+def _post(client, user, account, key, amount=5, token=None):
+    headers = {"Idempotency-Key": key}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    return client.post(f"/users/{user['id']}/transactions/", headers=headers,
+                       json={"amount": amount, "category_id": 1, "account_id": account["id"], "date": "2026-09-01"})
+
+
+def test_retry_replays_the_first_response(client, db, user, make_account):
+    account = make_account()
+    first = _post(client, user, account, "retry-1")
+    second = _post(client, user, account, "retry-1")
+
+    assert second.status_code == 200
+    assert second.headers["idempotent-replayed"] == "true"
+    assert second.json()["id"] == first.json()["id"]
+    assert str(db.get(models.Account, account["id"]).balance) == "5.00"
+
+
+def test_same_key_with_another_body_is_rejected(client, user, make_account):
+    account = make_account()
+    _post(client, user, account, "retry-2")
+    assert _post(client, user, account, "retry-2", amount=6).status_code == 422
+
+
+def test_keys_are_scoped_to_the_caller(client, user, make_account):
+    account = make_account()
+    mine = _post(client, user, account, "retry-3", token=create_access_token({"sub": user["email"]}))
+    refreshed = _post(client, user, account, "retry-3", token=create_access_token({"sub": user["email"], "n": 1}))
+    other = _post(client, user, account, "retry-3", token=create_access_token({"sub": "otro@test.com"}))
+
+    assert refreshed.json()["id"] == mine.json()["id"]  # mismo usuario con un token nuevo
+    assert "idempotent-replayed" not in other.headers
+    assert other.json()["id"] != mine.json()["id"]
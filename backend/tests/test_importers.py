@@ -0,0 +1,44 @@
+import io
+
+import importers
+import models
+
+
+def _import(client, user, content, **params):
+    files = {"file": ("extracto.csv", io.BytesIO(content.encode()), "text/csv")}
+    response = client.post(f"/users/{user['id']}/transactions/import", files=files, params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_csv_import_posts_to_the_ledger(client, db, user, make_account):
+    account = make_account()
+    result = _import(client, user, "date,amount,description\n"
+                                   "2026-09-01,\"1.234,56\",Sueldo\n"
+                                   "05/09/2026,-34.56,Super\n",
+                     account_id=account["id"], category_id=1)
+    assert result == {"imported": 2, "skipped": 0, "errors": []}
+    assert str(db.get(models.Account, account["id"]).balance) == "1200.00"
+
+
+def test_truncated_row_is_reported_not_crashed(client, db, user, make_account):
+    account = make_account()
+    result = _import(client, user, "date,amount,description\n"
+                                   "2026-09-01,100,Uno\n"
+                                   "2026-09-02\n"
+                                   "2026-09-03,50,Tres\n",
+                     account_id=account["id"], category_id=1)
+    assert result["imported"] == 2
+    assert result["skipped"] == 1
+    assert result["errors"] == [{"line": 3, "error": "Monto vacío"}]
+    assert str(db.get(models.Account, account["id"]).balance) == "150.00"
+
+
+def test_truncated_row_in_a_later_chunk(db, user, make_account):
+    # Los lotes anteriores ya se commitearon: una fila rota después no puede cortar la importación
+    account = make_account()
+    stream = io.StringIO("date,amount\n2026-09-01,10\n2026-09-02,20\n2026-09-03\n")
+    result = importers.import_transactions(db, user["id"], importers.parse_csv(stream),
+                                           account_id=account["id"], category_id=1, chunk_size=2)
+    assert (result["imported"], result["skipped"]) == (2, 1)
+    assert result["errors"][0]["line"] == 4
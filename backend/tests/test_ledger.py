@@ -0,0 +1,83 @@
+from datetime import date
+from decimal import Decimal
+
+import ledger
+import models
+
+
+def _post(client, user, account, amount, on):
+    response = client.post(f"/users/{user['id']}/transactions/",
+                           json={"amount": amount, "category_id": 1, "account_id": account["id"], "date": on})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_balance_equals_sum_of_entries(client, db, user, make_account):
+    account = make_account(balance=0.1)
+    for amount, on in [(0.1, "2026-08-10"), (0.1, "2026-08-11"), (-0.05, "2026-09-01")]:
+        _post(client, user, account, amount, on)
+
+    balance = db.get(models.Account, account["id"]).balance
+    entries = db.query(models.LedgerEntry).filter_by(account_id=account["id"]).all()
+    assert balance == Decimal("0.25")  # sin error de punto flotante
+    assert sum((e.amount for e in entries), Decimal(0)) == balance
+
+
+def test_ledger_listing_is_consistent_in_date_order(client, user, make_account):
+    account = make_account(balance=100)
+    _post(client, user, account, 50, "2026-08-10")
+    _post(client, user, account, -20, "2026-09-05")
+    _post(client, user, account, -5, "2026-08-20")  # con fecha atrasada
+
+    rows = client.get(f"/accounts/{account['id']}/ledger").json()
+    assert [r["date"] for r in rows] == sorted((r["date"] for r in rows), reverse=True)
+    assert rows[0]["balance_after"] == 125.0
+    for newer, older in zip(rows, rows[1:]):
+        assert newer["balance_after"] - newer["amount"] == older["balance_after"]
+    assert rows[-1]["balance_after"] - rows[-1]["amount"] == 0
+
+
+def test_balance_at_with_snapshots_and_backdated_posting(client, db, user, make_account):
+    account = make_account()
+    for amount, on in [(100, "2026-07-01"), (50, "2026-08-10"), (-20, "2026-09-05")]:
+        _post(client, user, account, amount, on)
+    ledger.take_monthly_snapshots(db, "2026-08")
+    ledger.take_monthly_snapshots(db, "2026-09")
+    _post(client, user, account, -5, "2026-08-20")
+
+    def at(on):
+        return client.get(f"/accounts/{account['id']}/balance", params={"at": on}).json()["balance"]
+
+    assert at("2026-08-15") == 150.0
+    assert at("2026-08-31") == 145.0
+    assert at("2026-09-30") == 125.0
+
+
+def test_rebuild_reproduces_balances(client, db, user, make_account):
+    account = make_account(balance=10)
+    _post(client, user, account, 2.5, "2026-05-01")
+    _post(client, user, account, -1.25, "2026-06-01")
+    before = db.get(models.Account, account["id"]).balance
+
+    ledger.rebuild(db)
+    db.expire_all()
+    entries = db.query(models.LedgerEntry).filter_by(account_id=account["id"]).all()
+    assert db.get(models.Account, account["id"]).balance == before
+    assert sum((e.amount for e in entries), Decimal(0)) == before
+
+
+def test_transaction_for_missing_account_is_404(client, db, user):
+    count = db.query(models.Transaction).count()
+    response = client.post(f"/users/{user['id']}/transactions/",
+                           json={"amount": 5, "category_id": 1, "account_id": 99999})
+    assert response.status_code == 404
+    assert db.query(models.Transaction).count() == count
+
+
+def test_insufficient_funds_leaves_balance_untouched(client, db, user, make_account):
+    account = make_account(balance=10)
+    goal = client.post(f"/users/{user['id']}/goals/",
+                       json={"name": "Viaje", "target_amount": 100, "currency": "ARS"}).json()
+    response = client.post(f"/goals/{goal['id']}/deposit", json={"account_id": account["id"], "amount": 50})
+    assert response.status_code == 400
+    assert db.get(models.Account, account["id"]).balance == Decimal("10.00")
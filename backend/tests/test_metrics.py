@@ -0,0 +1,34 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import database
+import metrics
+
+
+def _stacks(conn):
+    return [value for value in conn.info.values() if isinstance(value, list) and value]
+
+
+def test_failing_statements_do_not_leak_timings(client):
+    stats = metrics.RequestStats()
+    token = metrics._current.set(stats)
+    try:
+        with database.engine.connect() as conn:
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    conn.execute(text("SELECT * FROM no_existe"))
+                conn.rollback()
+            conn.execute(text("SELECT 1"))
+            assert _stacks(conn) == []
+    finally:
+        metrics._current.reset(token)
+
+    assert stats.queries == 1
+    assert 0 <= stats.db_seconds < 1
+
+
+def test_requests_count_their_queries(client, user):
+    response = client.get(f"/users/{user['id']}/accounts/")
+    assert 'desc="' in response.headers["server-timing"]
+    assert "queries" in response.headers["server-timing"]
@@ -0,0 +1,27 @@
+from sqlalchemy import text
+
+import database
+import migrations
+import models
+
+
+def test_native_types_migration_is_idempotent(client, db, user, make_account):
+    account = make_account(balance=10)
+    assert migrations.migrate_native_types(database.engine) == []
+
+    # Una base vieja: monto FLOAT con más de dos decimales y fecha con hora
+    with database.engine.begin() as conn:
+        conn.execute(text("UPDATE accounts SET balance = 10.456 WHERE id = :id"), {"id": account["id"]})
+        conn.execute(text("INSERT INTO transactions (amount, description, date, account_id, category_id) "
+                          "VALUES (1.5, 'vieja', '2024-05-01 00:00:00', :id, 1)"), {"id": account["id"]})
+
+    assert migrations.migrate_native_types(database.engine) == ["transactions.date", "accounts.balance"]
+    assert str(db.get(models.Account, account["id"]).balance) == "10.46"
+    assert migrations.migrate_native_types(database.engine) == []
+
+
+def test_upgrade_twice_changes_nothing(client):
+    migrations.upgrade(database.engine)
+    assert migrations.migrate_native_types(database.engine) == []
+    assert migrations.ensure_columns(database.engine) == []
+    assert migrations.ensure_indexes(database.engine) == []
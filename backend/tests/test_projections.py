@@ -0,0 +1,51 @@
+from datetime import date
+
+import projections
+
+
+def _goal(client, user, **fields):
+    response = client.post(f"/users/{user['id']}/goals/", json={"currency": "ARS", **fields})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _deposit(client, user, account, goal, amount, on):
+    # Un depósito con fecha: la transacción "Ahorro para meta" que arma deposit_to_goal
+    response = client.post(f"/users/{user['id']}/transactions/",
+                           json={"amount": -amount, "category_id": 1, "account_id": account["id"],
+                                 "description": f"{projections.DEPOSIT_PREFIX}{goal['name']}", "date": on})
+    assert response.status_code == 200, response.text
+
+
+def test_regular_deposits_project_a_completion_date(client, db, user, make_account):
+    account = make_account(balance=10000)
+    goal = _goal(client, user, name="Auto", target_amount=1200)
+    for month in range(4, 10):
+        _deposit(client, user, account, goal, 100, f"2026-{month:02d}-05")
+
+    [result] = projections.project_goals(db, user["id"], today=date(2026, 10, 18))
+    assert result["source"] == "deposits"
+    assert result["months_to_complete"] is not None
+    assert result["estimated_completion"] is not None
+
+
+def test_slow_pace_goal_has_no_completion_date(client, db, user, make_account):
+    account = make_account(balance=1000)
+    goal = _goal(client, user, name="Casa", target_amount=50_000_000, deadline="2030-01-01")
+    _deposit(client, user, account, goal, 100, "2026-09-05")
+
+    [result] = projections.project_goals(db, user["id"], today=date(2026, 10, 18))
+    assert result["months_to_complete"] is None
+    assert result["estimated_completion"] is None
+    assert result["on_track"] is False
+
+
+def test_slow_pace_goal_through_the_endpoint(client, user, make_account):
+    account = make_account(balance=1000)
+    goal = _goal(client, user, name="Casa", target_amount=50_000_000)
+    last_month = projections._add_months(date.today().replace(day=1), -1)
+    _deposit(client, user, account, goal, 100, last_month.isoformat())
+
+    response = client.get(f"/users/{user['id']}/goals/projections")
+    assert response.status_code == 200
+    assert response.json()[0]["estimated_completion"] is None
@@ -0,0 +1,49 @@
+from datetime import date
+
+import ledger
+import models
+import recurring
+
+
+def _subscription(db, user, billing_day=5, last_period="2026-07"):
+    card = models.CreditCard(name="Visa", limit=100000, closing_day=25, user_id=user["id"])
+    db.add(card)
+    db.flush()
+    subscription = models.Subscription(name="Video", price=10, currency="USD", billing_day=billing_day,
+                                       card_id=card.id, user_id=user["id"])
+    db.add(subscription)
+    db.flush()
+    db.add(models.SubscriptionCharge(subscription_id=subscription.id, period=last_period))
+    db.commit()
+    return subscription
+
+
+def _periods(db, subscription):
+    rows = db.query(models.SubscriptionCharge.period).filter_by(subscription_id=subscription.id)
+    return sorted(period for (period,) in rows)
+
+
+def test_scheduler_catches_up_missing_months_once(client, db, user):
+    subscription = _subscription(db, user)
+    today = date(2026, 10, 18)
+
+    recurring.materialize_due(db, today=today)
+    assert _periods(db, subscription) == ["2026-07", "2026-08", "2026-09", "2026-10"]
+    recurring.materialize_due(db, today=today)
+    assert _periods(db, subscription) == ["2026-07", "2026-08", "2026-09", "2026-10"]
+
+
+def test_scheduler_waits_for_the_billing_day(client, db, user):
+    subscription = _subscription(db, user, billing_day=20, last_period="2026-09")
+    recurring.materialize_due(db, today=date(2026, 10, 18))
+    assert _periods(db, subscription) == ["2026-09"]
+    recurring.materialize_due(db, today=date(2026, 10, 20))
+    assert _periods(db, subscription) == ["2026-09", "2026-10"]
+
+
+def test_monthly_snapshots_are_taken_once(client, db, user, make_account):
+    account = make_account(balance=50)
+    ledger.ensure_monthly_snapshots(db, today=date(2026, 11, 2))
+    ledger.ensure_monthly_snapshots(db, today=date(2026, 11, 2))
+    snapshots = db.query(models.BalanceSnapshot).filter_by(account_id=account["id"], month="2026-10").all()
+    assert [str(s.balance) for s in snapshots] == ["50.00"]
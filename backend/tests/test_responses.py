@@ -0,0 +1,66 @@
+import gzip
+import json
+
+import brotli
+import pytest
+
+
+@pytest.fixture
+def big_user(client, user, make_account):
+    # Suficientes movimientos para pasar COMPRESSION_MIN_SIZE
+    account = make_account()
+    for i in range(40):
+        client.post(f"/users/{user['id']}/transactions/",
+                    json={"amount": i + 1, "category_id": 1, "account_id": account["id"],
+                          "description": f"Movimiento número {i}", "date": "2026-09-01"})
+    return user
+
+
+def _raw(client, url, encoding):
+    # stream() no decodifica el body: vemos exactamente lo que mandó el server
+    with client.stream("GET", url, headers={"Accept-Encoding": encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+@pytest.mark.parametrize("encoding, decode", [
+    ("br", brotli.decompress),
+    ("gzip", gzip.decompress),
+    ("identity", lambda body: body),
+])
+def test_large_responses_are_compressed(client, big_user, encoding, decode):
+    url = f"/users/{big_user['id']}/transactions/"
+    response, body = _raw(client, url, encoding)
+    assert response.headers.get("content-encoding", "identity") == encoding
+    assert "Accept-Encoding" in response.headers["vary"]
+    if "content-length" in response.headers:
+        assert int(response.headers["content-length"]) == len(body)
+    assert len(json.loads(decode(body))) == 40
+
+
+def test_small_responses_are_not_compressed(client):
+    response, body = _raw(client, "/health", "br, gzip")
+    assert "content-encoding" not in response.headers
+    assert json.loads(body)["status"] == "ok"
+
+
+def test_streaming_export_is_compressed(client, big_user):
+    response, body = _raw(client, f"/users/{big_user['id']}/transactions/export?format=ndjson", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert len(gzip.decompress(body).splitlines()) == 40
+
+
+def test_middleware_on_a_plain_response():
+    # Sin otros middlewares: una respuesta de un solo trozo lleva el Content-Length comprimido
+    from fastapi.testclient import TestClient
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+    import responses
+
+    app = Starlette(routes=[Route("/", lambda request: PlainTextResponse("hola " * 500))])
+    app.add_middleware(responses.CompressionMiddleware)
+    response, body = _raw(TestClient(app), "/", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) == len(body)
+    assert gzip.decompress(body) == b"hola " * 500
@@ -0,0 +1,44 @@
+from datetime import date
+
+from sqlalchemy import text
+
+import crud
+import models
+import recurring
+
+
+def _subscription(client, user):
+    card = client.post(f"/users/{user['id']}/credit-cards/",
+                       json={"name": "Visa", "limit": 100000, "closing_day": 25}).json()
+    response = client.post(f"/users/{user['id']}/subscriptions/",
+                           json={"name": "Música", "price": 10, "currency": "USD",
+                                 "billing_day": date.today().day, "card_id": card["id"]})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _charge(db, subscription):
+    return db.query(models.SubscriptionCharge).filter_by(subscription_id=subscription["id"]).one()
+
+
+def test_deleting_a_charged_purchase_keeps_the_charge(client, db, user):
+    subscription = _subscription(client, user)
+    purchase_id = _charge(db, subscription).purchase_id
+    assert purchase_id is not None
+
+    assert client.delete(f"/card-purchases/{purchase_id}").status_code == 200
+    db.expire_all()
+    assert _charge(db, subscription).purchase_id is None
+
+    # El job no vuelve a cobrar el mes
+    recurring.materialize_due(db, catch_up=False)
+    assert db.query(models.SubscriptionCharge).filter_by(subscription_id=subscription["id"]).count() == 1
+
+
+def test_delete_purchase_with_foreign_keys_enforced(client, db, user):
+    # Como en Postgres: la FK se valida y el borrado no puede dejar el cobro apuntando a la nada
+    subscription = _subscription(client, user)
+    purchase_id = _charge(db, subscription).purchase_id
+    db.execute(text("PRAGMA foreign_keys=ON"))
+    assert crud.delete_card_purchase(db, purchase_id)
+    assert db.get(models.CardPurchase, purchase_id) is None
@@ -0,0 +1,19 @@
+def test_etag_returns_304_until_the_data_changes(client, user, make_account):
+    account = make_account()
+    url = f"/users/{user['id']}/accounts/"
+    etag = client.get(url).headers["etag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(url, headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+
+    client.post(f"/users/{user['id']}/transactions/",
+                json={"amount": 1, "category_id": 1, "account_id": account["id"]})
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_etag_is_per_user(client, user, make_account):
+    make_account()
+    other = client.post("/users/", json={"email": f"otro-{user['id']}@test.com", "password": "x"}).json()
+    etag = client.get(f"/users/{user['id']}/accounts/").headers["etag"]
+    assert client.get(f"/users/{other['id']}/accounts/", headers={"If-None-Match": etag}).status_code == 200
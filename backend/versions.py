@@ -0,0 +1,137 @@
+import hashlib
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, get_db
+import models
+
+
+# --- VERSIONES DE DATOS POR USUARIO (ETAG) ---
+# Cada usuario tiene un contador que sube cuando se escribe algo suyo, en la
+# misma transacción que la escritura. Los GET de listas arman el ETag con
+# ese contador: si el cliente manda If-None-Match con el mismo valor
+# respondemos 304 sin consultar ni serializar nada.
+# Las escrituras por el ORM se detectan solas (after_flush); los INSERT /
+# UPDATE masivos tienen que llamar a bump() a mano.
+# Lo global (categorías del sistema) usa la fila GLOBAL.
+
+GLOBAL = 0
+_BUMPED = "versions_bumped"
+
+# Modelos que no tienen user_id propio: cómo llegar al dueño
+_PARENTS = {
+    models.Transaction: (models.Account, "account_id"),
+    models.LedgerEntry: (models.Account, "account_id"),
+    models.BalanceSnapshot: (models.Account, "account_id"),
+    models.CardPurchase: (models.CreditCard, "card_id"),
+    models.CardInstallment: (models.CreditCard, "card_id"),
+    models.Job: (models.Client, "client_id"),
+    models.SubscriptionCharge: (models.Subscription, "subscription_id"),
+}
+_IGNORED = (models.User, models.DataVersion, models.IdempotencyKey)
+
+
+def _upsert(db: Session, user_ids):
+    table = models.DataVersion
+    values = [{"user_id": user_id, "version": 1} for user_id in sorted(user_ids)]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(values)
+        stmt = stmt.on_conflict_do_update(index_elements=[table.user_id],
+                                          set_={"version": table.version + 1})
+        db.connection().execute(stmt)
+        return
+
+    for row in values:
+        updated = db.connection().execute(
+            update(table).where(table.user_id == row["user_id"]).values(version=table.version + 1)
+        ).rowcount
+        if not updated:
+            db.connection().execute(table.__table__.insert().values(row))
+
+
+def bump(db: Session, *user_ids):
+    # Sube la versión (una vez por transacción y usuario); no hace commit
+    bumped = db.info.setdefault(_BUMPED, set())
+    pending = {GLOBAL if user_id is None else user_id for user_id in user_ids} - bumped
+    if not pending:
+        return
+    _upsert(db, pending)
+    bumped.update(pending)
+
+
+def get(db: Session, user_id: int):
+    rows = dict(db.execute(
+        select(models.DataVersion.user_id, models.DataVersion.version)
+        .where(models.DataVersion.user_id.in_([user_id, GLOBAL]))
+    ).all())
+    return rows.get(user_id, 0), rows.get(GLOBAL, 0)
+
+
+def _owners(session: Session, objects):
+    owners = set()
+    parent_ids = {}
+    for obj in objects:
+        if isinstance(obj, _IGNORED):
+            continue
+        if hasattr(obj, "user_id"):
+            owners.add(obj.user_id)
+            continue
+        parent = _PARENTS.get(type(obj))
+        if parent is not None:
+            parent_id = getattr(obj, parent[1])
+            if parent_id is not None:
+                parent_ids.setdefault(parent[0], set()).add(parent_id)
+
+    # Un SELECT por tabla padre (normalmente una sola cuenta o tarjeta)
+    for parent, ids in parent_ids.items():
+        rows = session.connection().execute(select(parent.user_id).where(parent.id.in_(ids)))
+        owners.update(user_id for (user_id,) in rows)
+    return owners
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_on_flush(session, flush_context):
+    owners = _owners(session, list(session.new) + list(session.dirty) + list(session.deleted))
+    if owners:
+        bump(session, *owners)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _reset(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_BUMPED, None)
+
+
+def _matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match usa comparación débil: ignoramos el prefijo W/
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def _check(user_id: int, request: Request, response: Response, version: int, global_version: int):
+    key = f"{request.url.path}?{request.url.query}|{user_id}|{version}|{global_version}"
+    etag = '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _matches(if_none_match, etag):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+
+def check_etag(user_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    # Dependencia para los GET de listas de /users/{user_id}/...
+    _check(user_id, request, response, *get(db, user_id))
+
+
+async def check_etag_async(user_id: int, request: Request, response: Response,
+                           db: AsyncSession = Depends(get_async_db)):
+    # Lo mismo para async_routes.py: usa la sesión async del request (la misma que la ruta)
+    _check(user_id, request, response, *await db.run_sync(get, user_id))
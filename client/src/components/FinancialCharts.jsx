@@ -2,14 +2,16 @@ import { PieChart, Pie, Cell, Tooltip, ResponsiveContainer, BarChart, Bar, XAxis
 
 const COLORS = ['#3b82f6', '#10b981', '#ef4444', '#f59e0b', '#8b5cf6', '#ec4899', '#6366f1']
 
-export const CategoryChart = ({ transactions, categories }) => {
-  // 1. Agrupar gastos por categoría
-  const data = categories.map(cat => {
-    const total = transactions
-      .filter(t => t.category_id === cat.id && t.amount < 0) // Solo gastos
-      .reduce((acc, t) => acc + Math.abs(t.amount), 0)
-    return { name: cat.name, value: total }
-  }).filter(item => item.value > 0) // Sacar categorías sin gastos
+export const CategoryChart = ({ totals }) => {
+  // 1. Gastos por categoría (el backend ya los manda sumados por mes y moneda)
+  const byName = {}
+  totals.forEach(t => {
+    const name = t.name || 'Sin categoría'
+    byName[name] = (byName[name] || 0) + t.total
+  })
+  const data = Object.entries(byName)
+    .map(([name, value]) => ({ name, value }))
+    .filter(item => item.value > 0) // Sacar categorías sin gastos
 
   if (data.length === 0) return <div className="h-64 flex items-center justify-center text-slate-500">Sin datos de gastos este mes.</div>
 
@@ -54,20 +56,19 @@ export const CategoryChart = ({ transactions, categories }) => {
   )
 }
 
-export const HistoryChart = ({ transactions }) => {
+export const HistoryChart = ({ history }) => {
     // 1. Agrupar por mes (Últimos 6 meses)
-    // Nota: Esto toma TODAS las transacciones históricas
+    // Nota: el backend ya manda ingresos/gastos sumados por mes y moneda
     const processData = () => {
         const months = {}
         
-        transactions.forEach(t => {
-            const date = t.date || "Sin fecha"
-            const monthKey = date.substring(0, 7) // "2025-01"
+        history.forEach(h => {
+            const monthKey = h.month // "2025-01"
             
             if (!months[monthKey]) months[monthKey] = { name: monthKey, ingresos: 0, gastos: 0 }
             
-            if (t.amount > 0) months[monthKey].ingresos += t.amount
-            else months[monthKey].gastos += Math.abs(t.amount)
+            months[monthKey].ingresos += h.income
+            months[monthKey].gastos += h.expense
         })
 
         // Convertir a array y ordenar
@@ -9,7 +9,7 @@ import { useAuth } from '../context/AuthContext'
 
 const Analytics = () => {
   const [loading, setLoading] = useState(true)
-  const [transactions, setTransactions] = useState([])
+  const [cashflow, setCashflow] = useState([])
   const [clients, setClients] = useState([])
   const [cards, setCards] = useState([])
   const [subs, setSubs] = useState([])
@@ -20,20 +20,15 @@ const Analytics = () => {
 
   const fetchData = async () => {
     try {
-      const [transRes, clientRes, cardRes, subRes] = await Promise.all([
-         axios.get(`https://fin-pro-t78k.onrender.com/users/${user.id}/transactions/`),
-         axios.get(`https://fin-pro-t78k.onrender.com/users/${user.id}/clients/`),
+      const [flowRes, clientRes, cardRes, subRes] = await Promise.all([
+         axios.get(`https://fin-pro-t78k.onrender.com/users/${user.id}/analytics/cashflow?months=6`),
+         axios.get(`https://fin-pro-t78k.onrender.com/users/${user.id}/clients/?include=jobs`),
          axios.get(`https://fin-pro-t78k.onrender.com/users/${user.id}/credit-cards/`),
          axios.get(`https://fin-pro-t78k.onrender.com/users/${user.id}/subscriptions/`)
       ])
       
-      const clientsWithJobs = await Promise.all(clientRes.data.map(async (c) => {
-          const jobsRes = await axios.get(`https://fin-pro-t78k.onrender.com/clients/${c.id}/jobs/`)
-          return { ...c, jobs: jobsRes.data }
-      }))
-
-      setTransactions(transRes.data)
-      setClients(clientsWithJobs)
+      setCashflow(flowRes.data)
+      setClients(clientRes.data)
       setCards(cardRes.data)
       setSubs(subRes.data)
       setLoading(false)
@@ -43,15 +38,16 @@ const Analytics = () => {
   useEffect(() => { fetchData() }, [])
 
   // --- PROCESAMIENTO ---
+  // El backend manda ingresos/gastos ya sumados por mes y moneda (últimos 6 meses)
   const getMonthlyEvolution = () => {
     const months = {}
-    transactions.forEach(t => {
-        const key = t.date ? t.date.slice(0, 7) : 'Sin Fecha'
+    cashflow.forEach(row => {
+        const key = row.month
         if(!months[key]) months[key] = { name: key, ingresos: 0, gastos: 0 }
-        if(t.amount > 0) months[key].ingresos += t.amount
-        else months[key].gastos += Math.abs(t.amount)
+        months[key].ingresos += row.income
+        months[key].gastos += row.expense
     })
-    return Object.values(months).sort((a,b) => a.name.localeCompare(b.name)).slice(-6)
+    return Object.values(months).sort((a,b) => a.name.localeCompare(b.name))
   }
 
   const getTopClients = () => {
@@ -66,9 +62,9 @@ const Analytics = () => {
   const getCostStructure = () => {
       const totalSubs = subs.reduce((acc, s) => acc + s.price, 0)
       const currentMonth = new Date().toISOString().slice(0, 7)
-      const monthlyExpenses = Math.abs(transactions
-        .filter(t => t.date && t.date.startsWith(currentMonth) && t.amount < 0)
-        .reduce((acc, t) => acc + t.amount, 0))
+      const monthlyExpenses = cashflow
+        .filter(row => row.month === currentMonth)
+        .reduce((acc, row) => acc + row.expense, 0)
       
       return [
           { name: 'Suscripciones', value: totalSubs },
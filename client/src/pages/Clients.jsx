@@ -84,10 +84,10 @@ const Clients = () => {
     e.preventDefault()
     setIsPaying(true)
     try {
-      await axios.post(`https://fin-pro-t78k.onrender.com/jobs/${jobToPay.id}/pay`, { 
-        account_id: parseInt(payAccountId),
-        exchange_rate: parseFloat(exchangeRate || 1)
-      })
+      // La cotización solo viaja si hay conversión (el backend la guarda como cotización del día)
+      const payload = { account_id: parseInt(payAccountId) }
+      if (needsConversion && exchangeRate) payload.exchange_rate = parseFloat(exchangeRate)
+      await axios.post(`https://fin-pro-t78k.onrender.com/jobs/${jobToPay.id}/pay`, payload)
       setIsPaying(false); setIsPayModalOpen(false); setJobToPay(null); openClientDetail(selectedClient); 
       toast.success("¡Cobro registrado exitosamente!", { icon: '💰' }) // <--- TOAST CON ICONO
     } catch (error) { setIsPaying(false); toast.error("Error al procesar cobro") }
@@ -11,26 +11,20 @@ import { useAuth } from '../context/AuthContext' // <--- 1. IMPORTANTE
 const Dashboard = () => {
   const { user } = useAuth() // <--- 2. USAMOS EL USUARIO REAL
 
-  const [accounts, setAccounts] = useState([])
-  const [categories, setCategories] = useState([])
-  const [transactions, setTransactions] = useState([])
+  const [summary, setSummary] = useState(null)
   const [loading, setLoading] = useState(true)
   const [isModalOpen, setIsModalOpen] = useState(false)
   const [currentDate, setCurrentDate] = useState(new Date()) 
 
+  const filterKey = currentDate.toISOString().slice(0, 7) 
+
+  // Todo lo de la pantalla (cuentas, saldos, gráficos, movimientos del mes) en una sola llamada
   const fetchData = async () => {
     if (!user) return // Si no hay usuario, esperamos
     
     try {
-      // <--- 3. USAMOS user.id EN LAS PETICIONES
-      const [accRes, catRes, transRes] = await Promise.all([
-         axios.get(`https://fin-pro-t78k.onrender.com/users/${user.id}/accounts/`),
-         axios.get(`https://fin-pro-t78k.onrender.com/users/${user.id}/categories/`),
-         axios.get(`https://fin-pro-t78k.onrender.com/users/${user.id}/transactions/`)
-      ])
-      setAccounts(accRes.data)
-      setCategories(catRes.data)
-      setTransactions(transRes.data)
+      const res = await axios.get(`https://fin-pro-t78k.onrender.com/users/${user.id}/dashboard?month=${filterKey}`)
+      setSummary(res.data)
     } catch (error) { 
       console.error(error)
       toast.error("Error cargando datos")
@@ -39,18 +33,23 @@ const Dashboard = () => {
     }
   }
 
-  // <--- 4. VIGILAMOS AL USUARIO (Array de dependencias)
+  // <--- 4. VIGILAMOS AL USUARIO Y EL MES ELEGIDO
   useEffect(() => { 
     fetchData() 
-  }, [user])
+  }, [user, currentDate])
 
   const handleCreateTransaction = async (data) => {
     try {
       // <--- 5. USAMOS user.id AL GUARDAR
-      await axios.post(`https://fin-pro-t78k.onrender.com/users/${user.id}/transactions/`, { ...data })
+      const res = await axios.post(`https://fin-pro-t78k.onrender.com/users/${user.id}/transactions/`, { ...data })
       setIsModalOpen(false)
       fetchData() // Recargar datos
       toast.success("Movimiento registrado")
+
+      // Aviso de presupuesto (el backend lo manda si la categoría tiene uno)
+      const budget = res.data.budget
+      if (budget && budget.status === 'exceeded') toast.error(`Te pasaste del presupuesto: ${budget.percent}% usado`)
+      else if (budget && budget.status === 'warning') toast(`Ojo: ya usaste el ${budget.percent}% del presupuesto`, { icon: '⚠️' })
     } catch (error) { toast.error("Error al guardar movimiento") }
   }
 
@@ -61,23 +60,26 @@ const Dashboard = () => {
   }
 
   const monthName = currentDate.toLocaleString('es-ES', { month: 'long', year: 'numeric' })
-  const filterKey = currentDate.toISOString().slice(0, 7) 
 
-  // Lógica de filtrado y cálculos (igual que antes)
-  const enrichedTransactions = transactions.map(t => {
+  // Los totales ya vienen sumados por moneda desde el backend
+  const accounts = summary ? summary.accounts : []
+  const categories = summary ? summary.category_list : []
+
+  const monthlyTransactions = (summary ? summary.transactions : []).map(t => {
       const account = accounts.find(a => a.id === t.account_id)
-      return { ...t, currency: account ? account.currency : 'ARS' } 
+      return { ...t, account, currency: account ? account.currency : 'ARS' } 
   })
 
-  const monthlyTransactions = enrichedTransactions.filter(t => t.date && t.date.startsWith(filterKey))
+  const balanceOf = (currency) => (summary ? summary.balances : []).filter(b => b.currency === currency).reduce((acc, b) => acc + b.balance, 0)
+  const flowOf = (currency, field) => (summary ? summary.cashflow : []).filter(c => c.currency === currency).reduce((acc, c) => acc + c[field], 0)
 
-  const totalBalanceARS = accounts.filter(a => a.currency === 'ARS').reduce((acc, item) => acc + item.balance, 0)
-  const totalBalanceUSD = accounts.filter(a => a.currency === 'USD').reduce((acc, item) => acc + item.balance, 0)
+  const totalBalanceARS = balanceOf('ARS')
+  const totalBalanceUSD = balanceOf('USD')
 
-  const incomeARS = monthlyTransactions.filter(t => t.amount > 0 && t.currency === 'ARS').reduce((acc, t) => acc + t.amount, 0)
-  const incomeUSD = monthlyTransactions.filter(t => t.amount > 0 && t.currency === 'USD').reduce((acc, t) => acc + t.amount, 0)
-  const expenseARS = Math.abs(monthlyTransactions.filter(t => t.amount < 0 && t.currency === 'ARS').reduce((acc, t) => acc + t.amount, 0))
-  const expenseUSD = Math.abs(monthlyTransactions.filter(t => t.amount < 0 && t.currency === 'USD').reduce((acc, t) => acc + t.amount, 0))
+  const incomeARS = flowOf('ARS', 'income')
+  const incomeUSD = flowOf('USD', 'income')
+  const expenseARS = flowOf('ARS', 'expense')
+  const expenseUSD = flowOf('USD', 'expense')
 
   return (
     <>
@@ -130,12 +132,12 @@ const Dashboard = () => {
                 )}
               </div>
             </div>
-            <CategoryChart transactions={monthlyTransactions} categories={categories} />
+            <CategoryChart totals={summary ? summary.categories : []} />
         </div>
 
         {/* COLUMNA DERECHA */}
         <div className="lg:col-span-2 space-y-6">
-            <HistoryChart transactions={enrichedTransactions} />
+            <HistoryChart history={summary ? summary.history : []} />
             <TransactionList transactions={monthlyTransactions} />
         </div>
       </div>